@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for code lookups while the mapping grows to 100k entries.
+
+Usage: python benchmarks/bench_code_lookup.py [--entries 100000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pseudonymization import TextAnonymizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark _get_code() as the mapping grows')
+    parser.add_argument('--entries', type=int, default=100000, help='Final mapping size (default: 100000)')
+    parser.add_argument('--step', type=int, default=10000, help='Report interval in entries (default: 10000)')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with contextlib.redirect_stdout(io.StringIO()):
+            anonymizer = TextAnonymizer(os.path.join(tmp, 'identifiers.txt'), os.path.join(tmp, 'replacements'))
+        
+        print(f"{'entries':>10} {'new (us/op)':>12} {'variant (us/op)':>16}")
+        
+        for size in range(args.step, args.entries + 1, args.step):
+            # New items
+            items = [f"Person {index}" for index in range(size - args.step, size)]
+            start = time.perf_counter()
+            for item in items:
+                anonymizer._get_code(item)
+            new_time = time.perf_counter() - start
+            
+            # Case variants of existing items
+            start = time.perf_counter()
+            for item in items:
+                anonymizer._get_code(item.upper())
+            variant_time = time.perf_counter() - start
+            
+            print(f"{size:>10} {new_time / len(items) * 1e6:>12.2f} {variant_time / len(items) * 1e6:>16.2f}")
+
+
+if __name__ == '__main__':
+    main()
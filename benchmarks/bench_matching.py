@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark anonymization throughput against the number of identifiers.
+
+Usage: python benchmarks/bench_matching.py [--size-kb 512] [--counts 1000,10000,100000,200000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pseudonymization import TextAnonymizer
+
+
+def make_identifiers(count, rng):
+    """
+    Generate synthetic single-word and two-word identifiers.
+    
+    :param count: Number of identifiers
+    :param rng: Random generator
+    :return: List of identifiers
+    """
+    identifiers = []
+    for index in range(count):
+        name = f"name{index}"
+        if rng.random() < 0.3:
+            name = f"{name} surname{rng.randrange(count)}"
+        identifiers.append(name)
+    return identifiers
+
+
+def make_text(size, identifiers, rng, density=0.02):
+    """
+    Generate filler text with identifiers sprinkled in.
+    
+    :param size: Approximate size in characters
+    :param identifiers: Identifiers to sprinkle in
+    :param rng: Random generator
+    :param density: Fraction of tokens that are identifiers
+    :return: Generated text
+    """
+    filler = ['the', 'report', 'was', 'sent', 'to', 'of', 'and', 'meeting', 'project', 'data']
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(identifiers) if rng.random() < density else rng.choice(filler)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark anonymize() throughput vs. identifier count')
+    parser.add_argument('--size-kb', type=int, default=512, help='Size of the generated text in KB (default: 512)')
+    parser.add_argument('--counts', default='1000,10000,100000,200000',
+                        help='Comma-separated identifier counts (default: 1000,10000,100000,200000)')
+    args = parser.parse_args()
+    
+    rng = random.Random(42)
+    print(f"{'identifiers':>12} {'load (s)':>10} {'anonymize (s)':>14} {'MB/s':>8}")
+    
+    for count in [int(value) for value in args.counts.split(',')]:
+        identifiers = make_identifiers(count, rng)
+        text = make_text(args.size_kb * 1024, identifiers, rng)
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            identifiers_file = os.path.join(tmp, 'identifiers.txt')
+            with open(identifiers_file, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(identifiers))
+            
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                anonymizer = TextAnonymizer(identifiers_file, os.path.join(tmp, 'replacements'))
+                load_time = time.perf_counter() - start
+                
+                start = time.perf_counter()
+                anonymizer.anonymize(text, 'bench.txt', detect_emails=False)
+                elapsed = time.perf_counter() - start
+        
+        megabytes = len(text.encode('utf-8')) / (1024 * 1024)
+        print(f"{count:>12} {load_time:>10.3f} {elapsed:>14.3f} {megabytes / elapsed:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
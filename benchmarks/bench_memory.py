@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for large identifier lists and code mappings.
+
+Each measurement runs in a fresh interpreter and reports the resident memory
+(VmRSS) after the step and the peak (VmHWM) from /proc, so it needs Linux.
+Identifiers are measured on the first run (which builds the index), on a run
+that reuses the index and with --no-index; the mapping is measured with the
+compact CodeMap and with plain dicts.
+
+Usage: python benchmarks/bench_memory.py [--entries 1000000] [--seed 42]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+SCENARIOS = ['first run', 'index run', 'no index', 'mapping (CodeMap)', 'mapping (dicts)']
+
+
+def memory_status():
+    """
+    Read the current and peak resident memory of this process.
+    
+    :return: Tuple of (VmRSS, VmHWM) in MB
+    """
+    values = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'VmHWM'):
+                values[key] = int(value.split()[0]) / 1024
+    return values['VmRSS'], values['VmHWM']
+
+
+def run_scenario(scenario, directory, entries):
+    """
+    Run one scenario in this process and print its measurements.
+    
+    :param scenario: Name from SCENARIOS
+    :param directory: Directory with identifiers.txt
+    :param entries: Number of mapping entries
+    """
+    from pseudonymization import TextAnonymizer
+    
+    identifiers = os.path.join(directory, 'identifiers.txt')
+    start = time.perf_counter()
+    if scenario.startswith('mapping'):
+        empty_list = os.path.join(directory, 'empty.txt')
+        open(empty_list, 'w').close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            anonymizer = TextAnonymizer(empty_list, os.path.join(directory, 'replacements'), use_index=False)
+        # Plain dicts throughout, or a CodeMap from the first code on
+        anonymizer.code_map_min_entries = None if scenario == 'mapping (dicts)' else 1
+        for index in range(entries):
+            anonymizer._get_code(f"Person {index}")
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            anonymizer = TextAnonymizer(identifiers, os.path.join(directory, 'replacements'),
+                                        use_index=scenario != 'no index')
+            anonymizer.anonymize("Warm-up text without identifiers.")
+    seconds = time.perf_counter() - start
+    rss, peak = memory_status()
+    print(f"{seconds} {rss} {peak}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark memory use of identifiers and code mappings')
+    parser.add_argument('--entries', type=int, default=1000000,
+                        help='Number of identifiers and mapping entries (default: 1000000)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the identifiers (default: 42)')
+    parser.add_argument('--scenario', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--directory', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.scenario:
+        run_scenario(args.scenario, args.directory, args.entries)
+        return
+    
+    if not os.path.exists('/proc/self/status'):
+        print("Error: bench_memory.py reads /proc and needs Linux.")
+        sys.exit(1)
+    
+    from corpus import make_identifiers
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        identifiers = make_identifiers(args.entries, 0.3, random.Random(args.seed))
+        with open(os.path.join(tmp, 'identifiers.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(identifiers) + '\n')
+        
+        print(f"{'scenario':<20} {'seconds':>8} {'RSS (MB)':>9} {'peak (MB)':>10}")
+        for scenario in SCENARIOS:
+            result = subprocess.run([sys.executable, os.path.abspath(__file__), '--scenario', scenario,
+                                     '--directory', tmp, '--entries', str(args.entries)],
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                print(result.stderr)
+                sys.exit(1)
+            seconds, rss, peak = map(float, result.stdout.split())
+            print(f"{scenario:<20} {seconds:>8.2f} {rss:>9.1f} {peak:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
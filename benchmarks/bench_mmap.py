@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark the memory-mapped file mode against reading and decoding the file.
+
+For each identifier density, a file is anonymized once as text (read,
+anonymize(), write) and once with anonymize_mapped(), and the outputs are
+compared.
+
+Usage: python benchmarks/bench_mmap.py [--size-mb 32] [--densities 0.02,0.001,0] [--identifiers 10000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pseudonymization import TextAnonymizer
+from corpus import make_identifiers, make_document
+
+
+def run(identifiers_file, replacements_dir, input_file, output_file, mapped):
+    """
+    Anonymize a file with a fresh anonymizer.
+    
+    :param identifiers_file: Path of the identifiers file
+    :param replacements_dir: Replacements directory
+    :param input_file: Input file path
+    :param output_file: Output file path
+    :param mapped: Whether to use anonymize_mapped()
+    :return: Elapsed time in seconds, without startup
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        anonymizer = TextAnonymizer(identifiers_file, replacements_dir, use_index=False)
+        anonymizer._get_matcher()
+        start = time.perf_counter()
+        if mapped:
+            anonymizer.anonymize_mapped(input_file, output_file)
+        else:
+            with open(input_file, 'r', encoding='utf-8') as f:
+                text, _ = anonymizer.anonymize(f.read(), input_file)
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(text)
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the memory-mapped file mode')
+    parser.add_argument('--size-mb', type=int, default=32, help='Size of each input file in MB (default: 32)')
+    parser.add_argument('--densities', default='0.02,0.001,0',
+                        help='Comma-separated identifier densities (default: 0.02,0.001,0)')
+    parser.add_argument('--identifiers', type=int, default=10000, help='Number of identifiers (default: 10000)')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        identifiers_file = os.path.join(tmp, 'identifiers.txt')
+        replacements_dir = os.path.join(tmp, 'replacements')
+        identifiers = make_identifiers(args.identifiers, 0.3, random.Random(42))
+        with open(identifiers_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(identifiers) + '\n')
+        
+        print(f"{'density':>8} {'text MB/s':>10} {'mmap MB/s':>10} {'speedup':>8} {'identical':>10}")
+        for density in (float(value) for value in args.densities.split(',')):
+            input_file = os.path.join(tmp, 'input.txt')
+            with open(input_file, 'w', encoding='utf-8') as f:
+                f.write(make_document(args.size_mb * 1024 * 1024, identifiers, density, density / 10,
+                                      random.Random(42)))
+            size_mb = os.path.getsize(input_file) / (1024 * 1024)
+            
+            text_file = os.path.join(tmp, 'text.txt')
+            mapped_file = os.path.join(tmp, 'mapped.txt')
+            text_time = run(identifiers_file, replacements_dir, input_file, text_file, False)
+            mapped_time = run(identifiers_file, replacements_dir, input_file, mapped_file, True)
+            with open(text_file, 'rb') as f, open(mapped_file, 'rb') as g:
+                identical = f.read() == g.read()
+            print(f"{density:>8} {size_mb / text_time:>10.2f} {size_mb / mapped_time:>10.2f} "
+                  f"{text_time / mapped_time:>7.2f}x {str(identical):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark anonymizing one large file split across worker processes.
+
+Runs anonymize() on the whole text once, then anonymize_parallel() with each
+worker count, and checks that every output is byte-identical to the
+single-process one.
+
+Usage: python benchmarks/bench_parallel.py [--size-mb 64] [--workers 1,2,4] [--identifiers 10000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pseudonymization import TextAnonymizer
+from corpus import make_identifiers, make_document
+
+
+def new_anonymizer(identifiers_file, replacements_dir):
+    """
+    Create an anonymizer with its matcher built, without the startup output.
+    
+    :param identifiers_file: Path of the identifiers file
+    :param replacements_dir: Replacements directory
+    :return: TextAnonymizer
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        anonymizer = TextAnonymizer(identifiers_file, replacements_dir, use_index=False)
+        anonymizer._get_matcher()
+    return anonymizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark intra-document parallelism on one large file')
+    parser.add_argument('--size-mb', type=int, default=64, help='Size of the input file in MB (default: 64)')
+    parser.add_argument('--workers', default='1,2,4', help='Comma-separated worker counts (default: 1,2,4)')
+    parser.add_argument('--identifiers', type=int, default=10000, help='Number of identifiers (default: 10000)')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        identifiers_file = os.path.join(tmp, 'identifiers.txt')
+        replacements_dir = os.path.join(tmp, 'replacements')
+        input_file = os.path.join(tmp, 'input.txt')
+        identifiers = make_identifiers(args.identifiers, 0.3, random.Random(42))
+        with open(identifiers_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(identifiers) + '\n')
+        with open(input_file, 'w', encoding='utf-8') as f:
+            f.write(make_document(args.size_mb * 1024 * 1024, identifiers, rng=random.Random(42)))
+        size_mb = os.path.getsize(input_file) / (1024 * 1024)
+        
+        anonymizer = new_anonymizer(identifiers_file, replacements_dir)
+        start = time.perf_counter()
+        with open(input_file, 'r', encoding='utf-8') as f:
+            text = f.read()
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected, _ = anonymizer.anonymize(text, input_file)
+        elapsed = time.perf_counter() - start
+        del text
+        
+        print(f"Input: {size_mb:.1f} MB, {os.cpu_count()} CPUs")
+        print(f"{'workers':>8} {'seconds':>8} {'MB/s':>8} {'identical':>10}")
+        print(f"{'single':>8} {elapsed:>8.2f} {size_mb / elapsed:>8.2f} {'-':>10}")
+        
+        output_file = os.path.join(tmp, 'output.txt')
+        for workers in (int(value) for value in args.workers.split(',')):
+            anonymizer = new_anonymizer(identifiers_file, replacements_dir)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                anonymizer.anonymize_parallel(input_file, output_file, workers)
+            elapsed = time.perf_counter() - start
+            with open(output_file, 'r', encoding='utf-8') as f:
+                identical = f.read() == expected
+            print(f"{workers:>8} {elapsed:>8.2f} {size_mb / elapsed:>8.2f} {str(identical):>10}")
+
+
+if __name__ == '__main__':
+    main()
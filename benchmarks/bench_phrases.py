@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark match finding on phrase-heavy input.
+
+Compares the current single-pass matcher with the previous approach: a
+find() loop per multi-word identifier with a nested overlap check against
+every earlier match, followed by a word scan that skips words through a
+set of every covered character offset (processed_positions).
+
+Usage: python benchmarks/bench_phrases.py [--size-kb 256] [--phrases 1000] [--legacy-max-kb 256]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pseudonymization import TextAnonymizer
+
+FILLER = ['the', 'report', 'was', 'sent', 'to', 'of', 'and', 'meeting', 'with']
+
+
+def make_phrases(count, rng):
+    """
+    Generate multi-word identifiers that share a few common heads.
+    
+    :param count: Number of phrases
+    :param rng: Random generator
+    :return: List of phrases
+    """
+    heads = ['van', 'de', 'jan', 'maria', 'stichting']
+    phrases = set()
+    while len(phrases) < count:
+        words = [rng.choice(heads)] + [f"name{rng.randrange(count)}" for _ in range(rng.randint(1, 4))]
+        phrases.add(' '.join(words))
+    return sorted(phrases)
+
+
+def make_text(size, phrases, rng):
+    """
+    Generate text in which about half of the words belong to a phrase.
+    
+    :param size: Approximate size in characters
+    :param phrases: Phrases to draw from
+    :param rng: Random generator
+    :return: Generated text
+    """
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(phrases) if rng.random() < 0.3 else rng.choice(FILLER)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def legacy_find_matches(text, identifiers):
+    """
+    Match finding as it was done with processed_positions.
+    
+    :param text: Input text
+    :param identifiers: Set of lowercased identifiers
+    :return: Set of matched items
+    """
+    matches = []
+    text_lower = text.lower()
+    for identifier in sorted((i for i in identifiers if ' ' in i), key=len, reverse=True):
+        start = 0
+        while True:
+            pos = text_lower.find(identifier, start)
+            if pos == -1:
+                break
+            end_pos = pos + len(identifier)
+            start = pos + 1
+            if (pos > 0 and text[pos - 1].isalnum()) or (end_pos < len(text) and text[end_pos].isalnum()):
+                continue
+            overlap = False
+            for existing_start, existing_end in matches:
+                if existing_start <= pos < existing_end or existing_start < end_pos <= existing_end:
+                    overlap = True
+                    break
+            if not overlap:
+                matches.append((pos, end_pos))
+    
+    items = set()
+    processed_positions = set()
+    for start_pos, end_pos in matches:
+        for i in range(start_pos, end_pos):
+            processed_positions.add(i)
+        items.add(text[start_pos:end_pos])
+    for match in re.finditer(r'\b\w+\b', text):
+        if any(pos in processed_positions for pos in range(*match.span())):
+            continue
+        if match.group().lower() in identifiers:
+            items.add(match.group())
+    return items
+
+
+def measure(function):
+    """
+    Return the time and the peak memory of one call each.
+    
+    :param function: Function without arguments
+    :return: Tuple of (seconds, peak allocated bytes)
+    """
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark match finding on phrase-heavy input')
+    parser.add_argument('--size-kb', type=int, default=256, help='Size of the generated text in KB (default: 256)')
+    parser.add_argument('--phrases', type=int, default=1000, help='Number of multi-word identifiers (default: 1000)')
+    parser.add_argument('--legacy-max-kb', type=int, default=256,
+                        help='Skip the legacy approach above this size, it is quadratic (default: 256)')
+    args = parser.parse_args()
+    
+    rng = random.Random(42)
+    phrases = make_phrases(args.phrases, rng)
+    text = make_text(args.size_kb * 1024, phrases, rng)
+    megabytes = len(text.encode('utf-8')) / (1024 * 1024)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        identifiers_file = os.path.join(tmp, 'identifiers.txt')
+        with open(identifiers_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(phrases) + '\n')
+        with contextlib.redirect_stdout(io.StringIO()):
+            anonymizer = TextAnonymizer(identifiers_file, os.path.join(tmp, 'replacements'), use_index=False)
+    
+    matcher = anonymizer._get_matcher()
+    print(f"{len(phrases)} phrases, {megabytes:.2f} MB of text, "
+          f"{len(list(matcher.finditer(text)))} matches")
+    print(f"{'approach':<28} {'MB/s':>10} {'peak memory (MB)':>18}")
+    
+    runs = [('matcher', lambda: list(anonymizer._find_matches(text)))]
+    if args.size_kb <= args.legacy_max_kb:
+        runs.append(('legacy processed_positions', lambda: legacy_find_matches(text, anonymizer.identifiers)))
+    
+    for name, function in runs:
+        seconds, peak = measure(function)
+        print(f"{name:<28} {megabytes / seconds:>10.2f} {peak / (1024 * 1024):>18.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark the matcher's prefilter on a corpus where most documents contain
+no identifiers at all.
+
+Every document is anonymized with anonymize() with the prefilter switched off
+and on, for both the parsed identifier set and the compiled index (memory-mapped,
+as it is for lists of INDEX_MAP_MIN_IDENTIFIERS and more). Throughput
+is reported separately for the clean documents, the documents with
+identifiers and the whole corpus, and the outputs are compared.
+
+Usage: python benchmarks/bench_prefilter.py [--documents 200] [--size-kb 64] [--clean 0.9] [--identifiers 10000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pseudonymization
+from pseudonymization import TextAnonymizer
+from corpus import make_identifiers, make_document
+
+
+def run(identifiers_file, replacements_dir, documents, use_index, prefilter):
+    """
+    Anonymize every document with a fresh anonymizer.
+    
+    :param identifiers_file: Path of the identifiers file
+    :param replacements_dir: Replacements directory
+    :param documents: List of (text, is_clean) tuples
+    :param use_index: Whether to use the compiled identifier index
+    :param prefilter: Whether the matcher skips blocks without identifier heads
+    :return: Tuple of (seconds for clean documents, seconds for the others, outputs)
+    """
+    times = {True: 0.0, False: 0.0}
+    outputs = []
+    # Build and map the index even for a list below the threshold
+    pseudonymization.INDEX_MAP_MIN_IDENTIFIERS = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        anonymizer = TextAnonymizer(identifiers_file, replacements_dir, use_index=use_index)
+        for index, (text, clean) in enumerate(documents):
+            anonymizer._get_matcher().prefilter = prefilter
+            start = time.perf_counter()
+            output, _ = anonymizer.anonymize(text, f'document_{index}')
+            times[clean] += time.perf_counter() - start
+            outputs.append(output)
+    return times[True], times[False], outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the prefilter on mostly clean documents')
+    parser.add_argument('--documents', type=int, default=200, help='Number of documents (default: 200)')
+    parser.add_argument('--size-kb', type=int, default=64, help='Size of each document in KB (default: 64)')
+    parser.add_argument('--clean', type=float, default=0.9,
+                        help='Fraction of documents without identifiers or emails (default: 0.9)')
+    parser.add_argument('--density', type=float, default=0.02,
+                        help='Fraction of identifier tokens in the other documents (default: 0.02)')
+    parser.add_argument('--identifiers', type=int, default=10000, help='Number of identifiers (default: 10000)')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        identifiers_file = os.path.join(tmp, 'identifiers.txt')
+        identifiers = make_identifiers(args.identifiers, 0.3, random.Random(42))
+        with open(identifiers_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(identifiers) + '\n')
+        
+        rng = random.Random(42)
+        documents = []
+        for _ in range(args.documents):
+            clean = rng.random() < args.clean
+            density = 0 if clean else args.density
+            text = make_document(args.size_kb * 1024, identifiers, density, density / 10, rng)
+            documents.append((text, clean))
+        clean_mb = sum(len(text) for text, clean in documents if clean) / (1024 * 1024)
+        other_mb = sum(len(text) for text, clean in documents if not clean) / (1024 * 1024)
+        
+        print(f"{args.documents} documents: {clean_mb:.1f} MB clean, {other_mb:.1f} MB with identifiers")
+        print(f"{'backend':>8} {'prefilter':>10} {'clean MB/s':>11} {'other MB/s':>11} {'total MB/s':>11} "
+              f"{'identical':>10}")
+        for use_index in (False, True):
+            backend = 'index' if use_index else 'set'
+            expected = None
+            for prefilter in (False, True):
+                replacements_dir = os.path.join(tmp, f'replacements_{backend}_{prefilter}')
+                clean_time, other_time, outputs = run(identifiers_file, replacements_dir, documents,
+                                                      use_index, prefilter)
+                if expected is None:
+                    expected = outputs
+                identical = outputs == expected
+                print(f"{backend:>8} {'on' if prefilter else 'off':>10} "
+                      f"{clean_mb / clean_time if clean_time else 0.0:>11.2f} "
+                      f"{other_mb / other_time if other_time else 0.0:>11.2f} "
+                      f"{(clean_mb + other_mb) / (clean_time + other_time):>11.2f} {str(identical):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark bulk deanonymization of many files against a few replacement files.
+
+Each replacement file comes from anonymizing one document, which is then
+split into files. The files are restored once one by one with a cold mapping
+cache (like separate -r -f runs), and then with deanonymize_batch() per worker
+count, and every output is compared with the one-by-one result.
+
+Usage: python benchmarks/bench_restore.py [--mappings 8] [--files 50] [--workers 1,2,4] [--identifiers 10000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pseudonymization import TextAnonymizer
+from corpus import make_identifiers, make_document
+
+
+def new_anonymizer(identifiers_file, replacements_dir):
+    """
+    Create an anonymizer without the startup output.
+    
+    :param identifiers_file: Path of the identifiers file
+    :param replacements_dir: Replacements directory
+    :return: TextAnonymizer
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        return TextAnonymizer(identifiers_file, replacements_dir, use_index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bulk deanonymization with the mapping cache')
+    parser.add_argument('--mappings', type=int, default=8, help='Number of replacement files (default: 8)')
+    parser.add_argument('--files', type=int, default=50, help='Files per replacement file (default: 50)')
+    parser.add_argument('--file-kb', type=int, default=16, help='Size of each file in KB (default: 16)')
+    parser.add_argument('--workers', default='1,2,4', help='Comma-separated worker counts (default: 1,2,4)')
+    parser.add_argument('--identifiers', type=int, default=10000, help='Number of identifiers (default: 10000)')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        identifiers_file = os.path.join(tmp, 'identifiers.txt')
+        identifiers = make_identifiers(args.identifiers, 0.3, random.Random(42))
+        with open(identifiers_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(identifiers) + '\n')
+        
+        pairs = []
+        rng = random.Random(42)
+        for mapping in range(args.mappings):
+            anonymizer = new_anonymizer(identifiers_file, os.path.join(tmp, f'replacements_{mapping}'))
+            for index in range(args.files):
+                document = make_document(args.file_kb * 1024, identifiers, rng=rng)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    text = ''.join(anonymizer.anonymize_stream([document], f'doc_{mapping}'))
+                input_file = os.path.join(tmp, 'anonymized', f'doc_{mapping}_{index}.txt')
+                os.makedirs(os.path.dirname(input_file), exist_ok=True)
+                with open(input_file, 'w', encoding='utf-8', newline='') as f:
+                    f.write(text)
+            # The mapping only grows, so the last save covers every file
+            replacement_file = anonymizer.last_replacement_file
+            pairs.extend((os.path.join(tmp, 'anonymized', f'doc_{mapping}_{index}.txt'), replacement_file)
+                         for index in range(args.files))
+        random.Random(42).shuffle(pairs)
+        
+        print(f"{len(pairs)} files against {args.mappings} replacement files, {os.cpu_count()} CPUs")
+        print(f"{'mode':>10} {'seconds':>8} {'files/s':>8} {'hit rate':>9} {'identical':>10}")
+        
+        anonymizer = new_anonymizer(identifiers_file, os.path.join(tmp, 'replacements'))
+        start = time.perf_counter()
+        expected = {}
+        for path, replacement_file in pairs:
+            anonymizer._code_matchers.clear()
+            with open(path, 'r', encoding='utf-8', newline='') as f, \
+                    contextlib.redirect_stdout(io.StringIO()):
+                expected[path] = anonymizer.deanonymize(f.read(), replacement_file)
+        elapsed = time.perf_counter() - start
+        print(f"{'per file':>10} {elapsed:>8.2f} {len(pairs) / elapsed:>8.1f} {0.0:>9.1%} {'-':>10}")
+        
+        for workers in (int(value) for value in args.workers.split(',')):
+            anonymizer = new_anonymizer(identifiers_file, os.path.join(tmp, 'replacements'))
+            output_dir = os.path.join(tmp, f'restored_{workers}')
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()) as report:
+                results = anonymizer.deanonymize_batch(pairs, workers, output_dir)
+            elapsed = time.perf_counter() - start
+            identical = len(results) == len(pairs)
+            for result in results:
+                with open(result['output_file'], 'r', encoding='utf-8', newline='') as f:
+                    identical &= f.read() == expected[result['input_file']]
+            hit_rate = report.getvalue().rsplit('(', 1)[1].split('%')[0]
+            print(f"{workers:>10} {elapsed:>8.2f} {len(pairs) / elapsed:>8.1f} {hit_rate + '%':>9} "
+                  f"{str(identical):>10}")
+
+
+if __name__ == '__main__':
+    main()
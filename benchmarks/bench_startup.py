@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Benchmark TextAnonymizer startup with and without the compiled identifier index.
+
+Usage: python benchmarks/bench_startup.py [--identifiers 1000000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pseudonymization import TextAnonymizer
+
+
+def timed_start(identifiers_file, replacements_dir, use_index):
+    """
+    Create an anonymizer and build its matcher, as a CLI run would.
+    
+    :param identifiers_file: Path of the identifiers file
+    :param replacements_dir: Replacements directory
+    :param use_index: Whether to use the compiled index
+    :return: Elapsed time in seconds
+    """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        anonymizer = TextAnonymizer(identifiers_file, replacements_dir, use_index)
+        anonymizer._get_matcher()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark startup time vs. identifier index')
+    parser.add_argument('--identifiers', type=int, default=1000000, help='Number of identifiers (default: 1000000)')
+    args = parser.parse_args()
+    
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        identifiers_file = os.path.join(tmp, 'identifiers.txt')
+        replacements_dir = os.path.join(tmp, 'replacements')
+        with open(identifiers_file, 'w', encoding='utf-8') as f:
+            for index in range(args.identifiers):
+                surname = f" surname{rng.randrange(args.identifiers)}" if rng.random() < 0.3 else ''
+                f.write(f"name{index}{surname}\n")
+        
+        print(f"Identifiers:              {args.identifiers}")
+        print(f"Without index:            {timed_start(identifiers_file, replacements_dir, False):.3f}s")
+        print(f"Building index:           {timed_start(identifiers_file, replacements_dir, True):.3f}s")
+        print(f"With index:               {timed_start(identifiers_file, replacements_dir, True):.4f}s")
+
+
+if __name__ == '__main__':
+    main()
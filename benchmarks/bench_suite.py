@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the anonymize/deanonymize paths on a synthetic corpus.
+
+Times anonymize, _find_multi_word_matches, _find_email_addresses and
+deanonymize separately for each document size, and reports throughput,
+peak memory and the scaling curve per stage as JSON. With --baseline the
+run is compared with an earlier report and exits with status 1 if a stage
+got slower than the tolerance allows.
+
+Usage: python benchmarks/bench_suite.py [--sizes-kb 256,1024,4096] [--identifiers 10000]
+                                        [--density 0.02] [--multi-word-ratio 0.3]
+                                        [--email-density 0.002] [--seed 42] [--repeat 3]
+                                        [--output report.json] [--baseline old.json] [--tolerance 0.2]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pseudonymization import TextAnonymizer
+from corpus import make_identifiers, make_document
+
+STAGES = ['anonymize', 'find_multi_word_matches', 'find_email_addresses', 'deanonymize']
+
+
+def reset_mapping(anonymizer):
+    """
+    Start a fresh code space, so every anonymize run does the same work.
+    
+    :param anonymizer: TextAnonymizer
+    """
+    anonymizer.word_to_code, anonymizer.code_to_word, anonymizer.normalized_to_code = {}, {}, {}
+    anonymizer._code_map = None
+    anonymizer.current_code_index = 1
+
+
+def measure(function, repeat):
+    """
+    Return the best time of several runs and the peak memory of one traced run.
+    
+    :param function: Function without arguments
+    :param repeat: Number of timed runs
+    :return: Tuple of (seconds, peak allocated bytes)
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    
+    # Tracing slows allocation down, so memory is measured in a separate run
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def run_size(anonymizer, text, repeat):
+    """
+    Benchmark all stages on one document.
+    
+    :param anonymizer: TextAnonymizer with the corpus identifiers loaded
+    :param text: Document
+    :param repeat: Number of timed runs per stage
+    :return: Dictionary of stage -> measurements
+    """
+    megabytes = len(text.encode('utf-8')) / (1024 * 1024)
+    
+    def anonymize():
+        reset_mapping(anonymizer)
+        return anonymizer.anonymize(text, 'bench')
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        anonymized, replacement_file = anonymize()
+        functions = {
+            'anonymize': anonymize,
+            'find_multi_word_matches': lambda: anonymizer._find_multi_word_matches(text),
+            'find_email_addresses': lambda: anonymizer._find_email_addresses(text),
+            'deanonymize': lambda: anonymizer.deanonymize(anonymized, replacement_file),
+        }
+        stages = {}
+        for stage in STAGES:
+            seconds, peak = measure(functions[stage], repeat)
+            stages[stage] = {
+                'seconds': round(seconds, 6),
+                'mb_per_s': round(megabytes / seconds, 3),
+                'peak_memory_mb': round(peak / (1024 * 1024), 3),
+            }
+    
+    stages['anonymize']['codes'] = len(anonymizer.code_to_word)
+    stages['find_multi_word_matches']['matches'] = len(anonymizer._find_multi_word_matches(text))
+    return stages
+
+
+def compare(report, baseline, tolerance):
+    """
+    Find stages whose throughput dropped below the baseline.
+    
+    :param report: Report of this run
+    :param baseline: Earlier report
+    :param tolerance: Allowed relative slowdown (0.2 = 20%)
+    :return: List of regression descriptions
+    """
+    previous = {(result['size_kb'], stage): measurements['mb_per_s']
+                for result in baseline['results'] for stage, measurements in result['stages'].items()}
+    regressions = []
+    for result in report['results']:
+        for stage, measurements in result['stages'].items():
+            old = previous.get((result['size_kb'], stage))
+            if old and measurements['mb_per_s'] < old * (1 - tolerance):
+                regressions.append(f"{stage} at {result['size_kb']} KB: "
+                                   f"{measurements['mb_per_s']:.2f} MB/s (baseline {old:.2f} MB/s)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the anonymize/deanonymize paths')
+    parser.add_argument('--sizes-kb', default='256,1024,4096',
+                        help='Comma-separated document sizes in KB (default: 256,1024,4096)')
+    parser.add_argument('--identifiers', type=int, default=10000, help='Number of identifiers (default: 10000)')
+    parser.add_argument('--density', type=float, default=0.02,
+                        help='Fraction of tokens that are identifiers (default: 0.02)')
+    parser.add_argument('--multi-word-ratio', type=float, default=0.3,
+                        help='Fraction of identifiers with several words (default: 0.3)')
+    parser.add_argument('--email-density', type=float, default=0.002,
+                        help='Fraction of tokens that are email addresses (default: 0.002)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per stage, the best counts (default: 3)')
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+    parser.add_argument('--baseline', help='Earlier JSON report to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed throughput drop against the baseline (default: 0.2)')
+    args = parser.parse_args()
+    
+    sizes = [int(size) for size in args.sizes_kb.split(',')]
+    rng = random.Random(args.seed)
+    identifiers = make_identifiers(args.identifiers, args.multi_word_ratio, rng)
+    
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        identifiers_file = os.path.join(tmp, 'identifiers.txt')
+        with open(identifiers_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(identifiers) + '\n')
+        
+        with contextlib.redirect_stdout(io.StringIO()):
+            anonymizer = TextAnonymizer(identifiers_file, os.path.join(tmp, 'replacements'))
+        
+        for size in sizes:
+            # Each size has its own generator, so a document does not depend on the other sizes
+            document_rng = random.Random(args.seed * 1000003 + size)
+            text = make_document(size * 1024, identifiers, args.density, args.email_density, document_rng)
+            results.append({
+                'size_kb': size,
+                'size_bytes': len(text.encode('utf-8')),
+                'stages': run_size(anonymizer, text, args.repeat),
+            })
+            print(f"{size} KB done", file=sys.stderr)
+    
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        'results': results,
+        # Throughput per stage against document size, for plotting
+        'scaling': {stage: [[result['size_kb'], result['stages'][stage]['mb_per_s']] for result in results]
+                    for stage in STAGES},
+    }
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"{'size (KB)':>10} " + ' '.join(f"{stage:>24}" for stage in STAGES))
+        for result in results:
+            print(f"{result['size_kb']:>10} " +
+                  ' '.join(f"{result['stages'][stage]['mb_per_s']:>19.2f} MB/s" for stage in STAGES))
+        print(f"Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+    
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic corpus generator for the benchmarks.
+
+Generates an identifier list and documents with a configurable size,
+identifier density, multi-word ratio and email density. The same seed
+always gives the same corpus.
+
+Usage: python benchmarks/corpus.py OUT_DIR [--identifiers 10000] [--size-kb 1024] [--documents 1]
+                                           [--density 0.02] [--multi-word-ratio 0.3]
+                                           [--email-density 0.002] [--seed 42]
+"""
+import argparse
+import os
+import random
+
+SYLLABLES = ['an', 'ber', 'de', 'el', 'fa', 'gen', 'har', 'in', 'jo', 'ka', 'lin', 'mar',
+             'no', 'or', 'pe', 'ri', 'san', 'ter', 'us', 'van', 'wil', 'zee']
+
+FILLER = ['the', 'report', 'was', 'sent', 'to', 'of', 'and', 'meeting', 'project', 'data',
+          'in', 'on', 'with', 'for', 'by', 'after', 'review', 'the', 'a', 'team', 'update',
+          'about', 'budget', 'contract', 'agreed', 'will', 'be', 'discussed', 'next', 'week']
+
+
+def make_name(rng):
+    """
+    Generate one capitalized name-like word.
+    
+    :param rng: Random generator
+    :return: Name
+    """
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def make_identifiers(count, multi_word_ratio=0.3, rng=None):
+    """
+    Generate unique single-word and multi-word identifiers.
+    
+    :param count: Number of identifiers
+    :param multi_word_ratio: Fraction of identifiers with two or three words
+    :param rng: Random generator (default: seeded with 42)
+    :return: List of identifiers
+    """
+    rng = rng or random.Random(42)
+    identifiers = []
+    seen = set()
+    while len(identifiers) < count:
+        if rng.random() < multi_word_ratio:
+            identifier = ' '.join(make_name(rng) for _ in range(rng.randint(2, 3)))
+        else:
+            identifier = make_name(rng)
+        # Numbered suffixes keep large lists unique without skewing the names
+        if identifier.lower() in seen:
+            identifier = f"{identifier}{len(identifiers)}"
+        seen.add(identifier.lower())
+        identifiers.append(identifier)
+    return identifiers
+
+
+def make_document(size, identifiers, density=0.02, email_density=0.002, rng=None):
+    """
+    Generate filler text with identifiers and email addresses mixed in.
+    
+    :param size: Approximate size in characters
+    :param identifiers: Identifiers to draw from
+    :param density: Fraction of tokens that are identifiers
+    :param email_density: Fraction of tokens that are email addresses
+    :param rng: Random generator (default: seeded with 42)
+    :return: Generated text
+    """
+    rng = rng or random.Random(42)
+    words = []
+    length = 0
+    while length < size:
+        roll = rng.random()
+        if roll < density and identifiers:
+            word = rng.choice(identifiers)
+            # Case variants must map to the same code
+            if rng.random() < 0.1:
+                word = word.upper()
+        elif roll < density + email_density:
+            word = f"{make_name(rng).lower()}.{rng.randrange(1000)}@example{rng.randrange(50)}.com"
+        else:
+            word = rng.choice(FILLER)
+        words.append(word)
+        length += len(word) + 1
+        if rng.random() < 0.08:
+            words.append('\n')
+    return ' '.join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a deterministic benchmark corpus')
+    parser.add_argument('out_dir', help='Directory to write identifiers.txt and the documents to')
+    parser.add_argument('--identifiers', type=int, default=10000, help='Number of identifiers (default: 10000)')
+    parser.add_argument('--size-kb', type=int, default=1024, help='Size of each document in KB (default: 1024)')
+    parser.add_argument('--documents', type=int, default=1, help='Number of documents (default: 1)')
+    parser.add_argument('--density', type=float, default=0.02,
+                        help='Fraction of tokens that are identifiers (default: 0.02)')
+    parser.add_argument('--multi-word-ratio', type=float, default=0.3,
+                        help='Fraction of identifiers with several words (default: 0.3)')
+    parser.add_argument('--email-density', type=float, default=0.002,
+                        help='Fraction of tokens that are email addresses (default: 0.002)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    os.makedirs(args.out_dir, exist_ok=True)
+    identifiers = make_identifiers(args.identifiers, args.multi_word_ratio, rng)
+    with open(os.path.join(args.out_dir, 'identifiers.txt'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(identifiers) + '\n')
+    
+    for index in range(args.documents):
+        text = make_document(args.size_kb * 1024, identifiers, args.density, args.email_density, rng)
+        with open(os.path.join(args.out_dir, f'document_{index:03d}.txt'), 'w', encoding='utf-8') as f:
+            f.write(text)
+    
+    print(f"Wrote {len(identifiers)} identifiers and {args.documents} documents to {args.out_dir}")
+
+
+if __name__ == '__main__':
+    main()
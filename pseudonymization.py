@@ -4,371 +4,4089 @@ import argparse
 import re
 import json
 import os
+import glob
+import time
+import hashlib
+import mmap
+import struct
+import zlib
+import sqlite3
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock; the mapping log is locked with msvcrt instead
+    fcntl = None
+    import msvcrt
+import signal
+import asyncio
+import csv
+from array import array
+from bisect import bisect_right
+from itertools import accumulate, chain, islice
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 
+# First run of word characters (or the first character) of an identifier;
+# candidate matches in the text are looked up by this head
+HEAD_PATTERN = re.compile(r'\w+|.', re.DOTALL)
+
+# Characters (or bytes) per block that the matcher's prefilter checks for
+# identifier heads before scanning it token by token; blocks end at a
+# non-word character, so no token is split
+PREFILTER_BLOCK_SIZE = 4096
+
+# Consecutive blocks with a head after which the prefilter is switched off,
+# until a scanned block turns out to have no match (dense text pays for the
+# check only a few times)
+PREFILTER_MAX_HITS = 4
+
+# A character that ends a token (the complement of regex \w)
+NON_WORD_PATTERN = re.compile(r'\W')
+NON_WORD_BYTES_PATTERN = re.compile(rb'\W')
+
+# Characters read per chunk in streaming mode
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Bytes per segment when one large file is split across worker processes;
+# segments end after a newline, which no identifier or email can contain
+PARALLEL_SEGMENT_SIZE = 8 * 1024 * 1024
+
+# Suffix of the compiled index written next to the identifiers file
+INDEX_SUFFIX = '.idx'
+
+# Mappings from this number of codes on are moved into a compact CodeMap;
+# smaller ones stay in plain dicts, which are faster to look up and extend
+CODE_MAP_MIN_ENTRIES = 1000000
+
+# Identifier lists from this size on get a compiled index, which is served
+# memory-mapped instead of keeping the parsed set (roughly 100 bytes per
+# identifier) in memory. Smaller lists are parsed on every run: reading an
+# index into a set is no faster than that, and sets have faster lookups
+INDEX_MAP_MIN_IDENTIFIERS = 1000000
+
+# Shape of the codes produced by _generate_code
+CODE_PATTERN = re.compile(r'\bX\d+\b')
+
+# One or more codes exactly as _generate_code produces them, one per line
+GENERATED_CODES_PATTERN = re.compile(r'X(?:0[1-9]|[1-9][0-9]+)(?:\nX(?:0[1-9]|[1-9][0-9]+))*')
+
+# Default TCP port of the serve subcommand
+SERVER_PORT = 8765
+
+# Latency samples kept per endpoint for the server statistics
+SERVER_LATENCY_WINDOW = 10000
+
+# Reason phrases of the HTTP statuses the server sends
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                500: 'Internal Server Error'}
+
+# Manifest of --incremental runs and the identifiers it was made with,
+# both kept in the replacements directory
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_IDENTIFIERS_FILE = 'manifest_identifiers.txt'
+
+# Names of files written next to their input, which a batch run over the same
+# directory or glob must not pick up as inputs
+GENERATED_OUTPUT_PATTERN = re.compile(r'_(?:de)?anonymized_\d{8}_\d{6}(?:\.[^.]*)?$')
+
+# Replacement files whose parsed mapping and code pattern are kept for
+# deanonymization; the least recently used one is dropped beyond this
+MAPPING_CACHE_SIZE = 16
+
+# Records processed per batch in --format csv/jsonl
+RECORD_BATCH_SIZE = 10000
+
+# Lines of a CSV input the delimiter is detected from
+CSV_SNIFF_LINES = 20
+
+# Longest email address that is detected (RFC 5321 limit)
+EMAIL_MAX_LENGTH = 254
+
+# Email detector: a comprehensive pattern with a simpler one as fallback.
+# The lookahead bounds the run of address characters, so whether an email
+# starts at a position never depends on text more than EMAIL_MAX_LENGTH away.
+EMAIL_PATTERN = re.compile(r'''
+    \b                                              # Word boundary
+    (?=[a-zA-Z0-9.!#$%&'*+/=?^_`{|}~@-]{3,254}      # Bounded run of address characters
+       (?![a-zA-Z0-9.!#$%&'*+/=?^_`{|}~@-]))
+    (?:
+        [a-zA-Z0-9.!#$%&'*+/=?^_`{|}~-]+            # Local part - allowed characters
+        @                                           # @ symbol
+        [a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?   # Domain name part
+        (?:\.[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?)* # Subdomains
+        \.[a-zA-Z]{2,}                              # Top-level domain (2+ chars)
+    |
+        [A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}  # Simpler fallback pattern
+    )
+    \b                                              # Word boundary
+''', re.VERBOSE)
+
+# The same detector for ASCII bytes (e.g. a mapped file), where it finds the
+# same emails as EMAIL_PATTERN does in the decoded text
+EMAIL_BYTES_PATTERN = re.compile(EMAIL_PATTERN.pattern.encode('ascii'), re.VERBOSE)
+
+# Finds the first byte that is not ASCII
+NON_ASCII_PATTERN = re.compile(rb'[\x80-\xff]')
+
+# ASCII bytes that count as word characters (same definition as regex \w)
+WORD_BYTES = frozenset(b'0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz')
+
+# Most buffers passed to one writev() call (the usual IOV_MAX)
+WRITEV_MAX_BUFFERS = 1024
+
+
+def _normalize(text):
+    """
+    Normalize text for case-insensitive comparison.
+    
+    :param text: Text to normalize
+    :return: Casefolded text
+    """
+    return text.casefold()
+
+
+def _is_word_char(char):
+    """
+    Check if a character counts as part of a word (same definition as regex \\w).
+    
+    :param char: Single character
+    :return: True if the character is alphanumeric or an underscore
+    """
+    return char.isalnum() or char == '_'
+
+
+def _format_code(number):
+    """
+    Format a code number as a code.
+    
+    :param number: Code number
+    :return: Code (X01, X02, etc.)
+    """
+    return f'X{number:02d}'
+
+
+def _code_number(code):
+    """
+    Return the number of a code of the generated shape.
+    
+    :param code: Code
+    :return: Code number, or None for codes of another shape (e.g. 'X1' or custom codes)
+    """
+    try:
+        number = int(code[1:])
+    except ValueError:
+        return None
+    # The round trip rejects other prefixes, signs, spaces and leading zeros
+    if 0 < number < 2 ** 32 and f'X{number:02d}' == code:
+        return number
+    return None
+
+
+def _code_numbers(codes):
+    """
+    Return the numbers of many codes at once, if all have the generated shape.
+    
+    :param codes: Iterable of codes
+    :return: List of code numbers, or None if any code has another shape
+    """
+    codes = list(codes)
+    if not codes:
+        return []
+    text = '\n'.join(codes)
+    # The line count rules out codes that contain a newline themselves
+    if text.count('\n') != len(codes) - 1 or not GENERATED_CODES_PATTERN.fullmatch(text):
+        return None
+    numbers = [int(code[1:]) for code in codes]
+    if numbers and max(numbers) >= 2 ** 32:
+        return None
+    return numbers
+
+
+class IdentifierMatcher:
+    """
+    Index over the normalized identifiers that finds every single-word and
+    multi-word match in one left-to-right scan of the text.
+    
+    Identifiers are grouped by their head (the first run of word characters).
+    The text is tokenized once with a compiled regex, and only tokens that are
+    a known head are expanded to the longest identifier starting there.
+    Matches are leftmost-longest, case-insensitive and must sit on word
+    boundaries at both ends.
+    
+    The text is first cut into blocks of about PREFILTER_BLOCK_SIZE, and the
+    distinct tokens of each block are checked against the heads as a set;
+    only blocks that contain a head are scanned token by token, so text
+    without identifiers is passed over at the speed of the regex. After
+    PREFILTER_MAX_HITS blocks in a row with a head the check is switched off
+    until a block without a match comes along, so dense text is not checked
+    twice.
+    """
+    
+    def __init__(self, identifiers):
+        """
+        Build the index.
+        
+        :param identifiers: Set of normalized identifiers or IndexedIdentifierSet (shared, not copied)
+        """
+        self.identifiers = identifiers
+        index = getattr(identifiers, 'index', None)
+        if index is not None:
+            # Heads of the indexed identifiers are read from the index file
+            self.heads = IndexedHeads(index)
+            self.max_length = index.max_length
+            self.leading_chars = set(index.leading_chars)
+            pending = identifiers.added
+        else:
+            self.heads = {}
+            self.max_length = 0
+            self.leading_chars = set()
+            pending = identifiers
+        
+        # Collect the lengths per head first, then sort each group once
+        grouped = {}
+        for identifier in pending:
+            # Single words are their own head
+            head = identifier if identifier.isalnum() else HEAD_PATTERN.match(identifier).group()
+            lengths = grouped.get(head)
+            if lengths is None:
+                grouped[head] = [len(identifier)]
+            else:
+                lengths.append(len(identifier))
+        for head, lengths in grouped.items():
+            lengths = set(lengths)
+            lengths.update(self.heads.get(head, ()))
+            lengths = tuple(sorted(lengths, reverse=True))
+            self.heads[head] = lengths
+            if lengths[0] > self.max_length:
+                self.max_length = lengths[0]
+            if not _is_word_char(head[0]):
+                self.leading_chars.add(head)
+        
+        self.size = len(identifiers)
+        # Heads keyed by ASCII bytes for finditer_bytes(), built on first use
+        self.byte_heads = None
+        # Skip blocks without a head instead of scanning them token by token
+        self.prefilter = True
+        self._compile()
+    
+    def _index(self, identifier):
+        """
+        Register the head and length of a normalized identifier.
+        
+        :param identifier: Normalized identifier
+        :return: True if the candidate pattern needs to be recompiled
+        """
+        head = HEAD_PATTERN.match(identifier).group()
+        length = len(identifier)
+        lengths = self.heads.get(head, ())
+        if length not in lengths:
+            self.heads[head] = tuple(sorted(lengths + (length,), reverse=True))
+            self.byte_heads = None
+        self.max_length = max(self.max_length, length)
+        
+        if not _is_word_char(head) and head not in self.leading_chars:
+            self.leading_chars.add(head)
+            return True
+        return False
+    
+    def _compile(self):
+        """
+        Compile the tokenizer that yields candidate match positions.
+        """
+        pattern = r'\w+'
+        if self.leading_chars:
+            # Identifiers that start with punctuation (e.g. '#tag')
+            pattern += '|[' + ''.join(re.escape(char) for char in sorted(self.leading_chars)) + ']'
+        self.candidate_pattern = re.compile(pattern)
+        
+        # Only ASCII leading characters can occur in ASCII bytes
+        pattern = rb'\w+'
+        leading_bytes = [char for char in sorted(self.leading_chars) if char.isascii()]
+        if leading_bytes:
+            pattern += b'|[' + re.escape(''.join(leading_bytes)).encode('ascii') + b']'
+        self.byte_candidate_pattern = re.compile(pattern)
+    
+    def _build_byte_heads(self):
+        """
+        Build the head -> lengths mapping keyed by ASCII bytes.
+        """
+        heads = {head.encode('ascii'): lengths for head, lengths in dict.items(self.heads) if head.isascii()}
+        index = getattr(self.identifiers, 'index', None)
+        if index is not None:
+            # Heads that are not in the dict are read from the index, which stores bytes
+            indexed = IndexedHeads(index)
+            dict.update(indexed, heads)
+            heads = indexed
+        self.byte_heads = heads
+    
+    def add(self, identifier):
+        """
+        Add a normalized identifier to the index.
+        
+        :param identifier: Normalized identifier
+        """
+        if identifier in self.identifiers:
+            return
+        self.identifiers.add(identifier)
+        if self._index(identifier):
+            self._compile()
+        self.size = len(self.identifiers)
+    
+    def _block_end(self, text, pos):
+        """
+        Find the end of the prefilter block that starts at pos.
+        
+        :param text: Input text, or ASCII bytes
+        :param pos: Start of the block
+        :return: Position of the first non-word character from pos + PREFILTER_BLOCK_SIZE on,
+                 or the end of the text
+        """
+        pattern = NON_WORD_PATTERN if isinstance(text, str) else NON_WORD_BYTES_PATTERN
+        match = pattern.search(text, pos + PREFILTER_BLOCK_SIZE)
+        return len(text) if match is None else match.start()
+    
+    def _has_head(self, heads, tokens):
+        """
+        Check whether any of the tokens is the head of an identifier.
+        
+        :param heads: self.heads, or self.byte_heads for byte tokens
+        :param tokens: Set of normalized tokens
+        :return: True if at least one token is a head
+        """
+        if type(heads) is dict:
+            return not heads.keys().isdisjoint(tokens)
+        # Heads in the index are looked up one distinct token at a time
+        return any(map(heads.get, tokens))
+    
+    def _block_has_head(self, text, start, end):
+        """
+        Prefilter: check whether text[start:end] contains a token that
+        finditer() would look up as a known head.
+        
+        :param text: Input text
+        :param start: Start of the block
+        :param end: End of the block, at a non-word character or the end of the text
+        :return: True if the block has to be scanned
+        """
+        block = text[start:end]
+        if block.isascii():
+            # Lowercasing is the casefold of ASCII and keeps every token intact
+            tokens = set(self.candidate_pattern.findall(block.lower()))
+        else:
+            # Casefolding the whole block could join tokens (e.g. U+0345 folds
+            # to a letter), so fold each distinct token like finditer() does
+            tokens = set()
+            for word in set(self.candidate_pattern.findall(block)):
+                folded = _normalize(word)
+                tokens.add(folded)
+                if len(folded) != len(word):
+                    tokens.add(HEAD_PATTERN.match(folded).group())
+        return self._has_head(self.heads, tokens)
+    
+    def _match_end(self, text, start, lengths):
+        """
+        Find the end of the longest identifier starting at a candidate position.
+        
+        :param text: Input text
+        :param start: Start position of the candidate token
+        :param lengths: Normalized identifier lengths for this head, longest first
+        :return: End position of the match, or None
+        """
+        identifiers = self.identifiers
+        text_length = len(text)
+        segment = text[start:start + lengths[0]]
+        folded = _normalize(segment)
+        
+        if len(folded) == len(segment):
+            # Casefolding kept every character at length 1, so positions line up
+            for length in lengths:
+                end = start + length
+                if end > text_length:
+                    continue
+                if folded[:length] in identifiers and (end == text_length or not _is_word_char(text[end])):
+                    return end
+            return None
+        
+        # Some characters expand when casefolded (e.g. 'ß' -> 'ss'); map folded
+        # lengths back to positions in the original text
+        parts = []
+        ends = {}
+        folded_length = 0
+        for index in range(start, min(text_length, start + lengths[0])):
+            part = _normalize(text[index])
+            parts.append(part)
+            folded_length += len(part)
+            ends[folded_length] = index + 1
+            if folded_length >= lengths[0]:
+                break
+        folded = ''.join(parts)
+        
+        for length in lengths:
+            end = ends.get(length)
+            if end is None:
+                continue
+            if folded[:length] in identifiers and (end == text_length or not _is_word_char(text[end])):
+                return end
+        return None
+    
+    def _match_end_bytes(self, data, start, lengths):
+        """
+        Find the end of the longest identifier starting at a candidate position
+        in ASCII bytes, where folded lengths and positions always line up.
+        
+        :param data: Bytes-like object
+        :param start: Start position of the candidate token
+        :param lengths: Normalized identifier lengths for this head, longest first
+        :return: End position of the match, or None
+        """
+        identifiers = self.identifiers
+        size = len(data)
+        # Latin-1 never fails; bytes past the ASCII region end after a newline
+        # that no identifier contains, so they cannot produce a match
+        folded = data[start:start + lengths[0]].lower().decode('latin-1')
+        for length in lengths:
+            end = start + length
+            if end > size:
+                continue
+            if folded[:length] in identifiers and (end == size or data[end] not in WORD_BYTES):
+                return end
+        return None
+    
+    def finditer_bytes(self, data, pos=0, endpos=None, folded=None, dense=False):
+        """
+        Find all identifier matches in ASCII bytes (e.g. a region of a mapped
+        file), with the same results as finditer() on the decoded text.
+        
+        :param data: Bytes-like object that is ASCII between pos and endpos
+        :param pos: Position to start scanning from
+        :param endpos: Position to stop scanning at, just after a newline or at
+                       the end of data (default: end of data)
+        :param folded: data[pos:endpos] lowercased, if already available
+        :param dense: Start without the prefilter, as after PREFILTER_MAX_HITS blocks with a head
+        :return: Iterator of (start_pos, end_pos) tuples in data order
+        """
+        if endpos is None:
+            endpos = len(data)
+        if self.byte_heads is None:
+            self._build_byte_heads()
+        heads = self.byte_heads
+        search = self.byte_candidate_pattern.finditer
+        findall = self.byte_candidate_pattern.findall
+        if folded is None:
+            # Lowercase the region once (the casefold of ASCII) instead of every token
+            folded = data[pos:endpos].lower()
+        # Positions in folded are relative to the start of the region
+        offset = pos
+        pos = 0
+        size = len(folded)
+        hits = PREFILTER_MAX_HITS if dense else 0
+        while pos < size:
+            block_end = self._block_end(folded, pos)
+            if self.prefilter and hits < PREFILTER_MAX_HITS:
+                if not self._has_head(heads, set(findall(folded, pos, block_end))):
+                    pos = block_end
+                    continue
+                hits += 1
+            found = False
+            tokens = search(folded, pos, block_end)
+            pos = block_end
+            while tokens is not None:
+                for token in tokens:
+                    lengths = heads.get(token.group())
+                    if lengths is None:
+                        continue
+                    start = offset + token.start()
+                    if start > 0 and data[start - 1] in WORD_BYTES:
+                        continue
+                    end = self._match_end_bytes(data, start, lengths)
+                    if end is not None:
+                        found = True
+                        yield start, end
+                        # Continue after the match instead of tokenizing the covered span
+                        if end - offset >= block_end:
+                            pos = end - offset
+                            tokens = None
+                        else:
+                            tokens = search(folded, end - offset, block_end)
+                        break
+                else:
+                    tokens = None
+            if not found:
+                # Sparse text again: check the next blocks first
+                hits = 0
+    
+    def finditer(self, text, pos=0, dense=False):
+        """
+        Find all identifier matches in the text.
+        
+        :param text: Input text
+        :param pos: Position to start scanning from
+        :param dense: Start without the prefilter, as after PREFILTER_MAX_HITS blocks with a head
+        :return: Iterator of (start_pos, end_pos) tuples in text order
+        """
+        heads = self.heads
+        search = self.candidate_pattern.finditer
+        size = len(text)
+        hits = PREFILTER_MAX_HITS if dense else 0
+        while pos < size:
+            block_end = self._block_end(text, pos)
+            if self.prefilter and hits < PREFILTER_MAX_HITS:
+                if not self._block_has_head(text, pos, block_end):
+                    pos = block_end
+                    continue
+                hits += 1
+            found = False
+            tokens = search(text, pos, block_end)
+            pos = block_end
+            while tokens is not None:
+                for token in tokens:
+                    word = token.group()
+                    folded = _normalize(word)
+                    lengths = heads.get(folded)
+                    if lengths is None:
+                        if len(folded) == len(word):
+                            continue
+                        # Casefolding can split a token (e.g. 'İ' -> 'i' + combining dot)
+                        lengths = heads.get(HEAD_PATTERN.match(folded).group())
+                        if lengths is None:
+                            continue
+                    start = token.start()
+                    if start > 0 and _is_word_char(text[start - 1]):
+                        continue
+                    end = self._match_end(text, start, lengths)
+                    if end is not None:
+                        found = True
+                        yield start, end
+                        # Continue after the match instead of tokenizing the covered span
+                        if end >= block_end:
+                            pos = end
+                            tokens = None
+                        else:
+                            tokens = search(text, end, block_end)
+                        break
+                else:
+                    tokens = None
+            if not found:
+                # Sparse text again: check the next blocks first
+                hits = 0
+
+
+class IdentifierIndex:
+    """
+    Compiled identifier index stored next to the identifiers file and
+    memory-mapped on load, so startup does not depend on the number of
+    identifiers.
+    
+    The file holds two open-addressing hash tables (normalized identifiers,
+    and heads with their identifier lengths) that are probed directly in the
+    mapped file. It records the size, mtime and SHA-256 of the source file
+    and is rebuilt when the source changes.
+    """
+    
+    MAGIC = b'PSIDX001'
+    # magic, byte order, source size, source mtime, source sha256, identifier
+    # count, identifier slots, head slots, max length, leading chars length
+    HEADER = struct.Struct('<8s1sQQ32sQQQQQ')
+    UINT32 = struct.Struct('<I')
+    
+    def __init__(self, path):
+        """
+        Open and memory-map an index file.
+        
+        :param path: Path of the index file
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        (magic, byte_order, self.source_size, self.source_mtime_ns, self.source_digest, self.count,
+         self.identifier_slots, self.head_slots, self.max_length, leading_length) = self.HEADER.unpack_from(self._mmap)
+        if magic != self.MAGIC or byte_order != sys.byteorder[0].encode():
+            raise ValueError(f"'{path}' is not a compatible identifier index")
+        
+        offset = self.HEADER.size
+        self.leading_chars = self._mmap[offset:offset + leading_length].decode('utf-8')
+        offset = self._align(offset + leading_length)
+        view = memoryview(self._mmap)
+        self._identifier_table = view[offset:offset + self.identifier_slots * 4].cast('I')
+        offset += self.identifier_slots * 4
+        self._head_table = view[offset:offset + self.head_slots * 4].cast('I')
+    
+    def __getstate__(self):
+        # Worker processes reopen the mapping instead of copying it
+        return {'path': self.path}
+    
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+    
+    @staticmethod
+    def _align(offset):
+        """
+        Round an offset up to a multiple of 4 bytes.
+        
+        :param offset: File offset
+        :return: Aligned offset
+        """
+        return (offset + 3) & ~3
+    
+    @staticmethod
+    def _slot_count(entries):
+        """
+        Number of hash table slots for a number of entries (load factor <= 0.5).
+        
+        :param entries: Number of entries
+        :return: Power of two slot count
+        """
+        slots = 8
+        while slots < entries * 2:
+            slots *= 2
+        return slots
+    
+    def matches_source(self, stat):
+        """
+        Check whether the index was built from a file with this size and mtime.
+        
+        :param stat: os.stat_result of the identifiers file
+        :return: True if size and mtime are unchanged
+        """
+        return self.source_size == stat.st_size and self.source_mtime_ns == stat.st_mtime_ns
+    
+    def _lookup(self, table, key):
+        """
+        Find the entry for a key in one of the hash tables.
+        
+        :param table: Slot table (memoryview of offsets)
+        :param key: Normalized string, or its UTF-8 bytes
+        :return: Offset just past the stored key, or None if not present
+        """
+        data = key if isinstance(key, bytes) else key.encode('utf-8')
+        mask = len(table) - 1
+        slot = zlib.crc32(data) & mask
+        buffer = self._mmap
+        while True:
+            offset = table[slot]
+            if not offset:
+                return None
+            start = offset + 4
+            end = start + self.UINT32.unpack_from(buffer, offset)[0]
+            if buffer[start:end] == data:
+                return end
+            slot = (slot + 1) & mask
+    
+    def __contains__(self, identifier):
+        return self._lookup(self._identifier_table, identifier) is not None
+    
+    def head_lengths(self, head):
+        """
+        Return the identifier lengths stored for a head.
+        
+        :param head: Normalized head, or its UTF-8 bytes
+        :return: Tuple of lengths, longest first, or None
+        """
+        offset = self._lookup(self._head_table, head)
+        if offset is None:
+            return None
+        count = self.UINT32.unpack_from(self._mmap, offset)[0]
+        return struct.unpack_from(f'<{count}I', self._mmap, offset + 4)
+    
+    def __iter__(self):
+        buffer = self._mmap
+        for offset in self._identifier_table:
+            if offset:
+                start = offset + 4
+                yield buffer[start:start + self.UINT32.unpack_from(buffer, offset)[0]].decode('utf-8')
+    
+    @classmethod
+    def write(cls, path, matcher, stat, digest):
+        """
+        Write an index file for the identifiers and heads of a matcher.
+        
+        :param path: Path of the index file
+        :param matcher: IdentifierMatcher built from the identifiers file
+        :param stat: os.stat_result of the identifiers file
+        :param digest: SHA-256 digest of the identifiers file
+        """
+        leading = ''.join(sorted(matcher.leading_chars)).encode('utf-8')
+        identifier_table = array('I', bytes(4 * cls._slot_count(len(matcher.identifiers))))
+        head_table = array('I', bytes(4 * cls._slot_count(len(matcher.heads))))
+        base = cls._align(cls.HEADER.size + len(leading)) + 4 * (len(identifier_table) + len(head_table))
+        blob = bytearray()
+        pack = cls.UINT32.pack
+        
+        # Entries are stored as <length><utf-8 key><payload>
+        mask = len(identifier_table) - 1
+        for identifier in matcher.identifiers:
+            data = identifier.encode('utf-8')
+            slot = zlib.crc32(data) & mask
+            while identifier_table[slot]:
+                slot = (slot + 1) & mask
+            identifier_table[slot] = base + len(blob)
+            blob += pack(len(data)) + data
+        
+        mask = len(head_table) - 1
+        for head, lengths in matcher.heads.items():
+            data = head.encode('utf-8')
+            slot = zlib.crc32(data) & mask
+            while head_table[slot]:
+                slot = (slot + 1) & mask
+            head_table[slot] = base + len(blob)
+            blob += pack(len(data)) + data + struct.pack(f'<I{len(lengths)}I', len(lengths), *lengths)
+        
+        if base + len(blob) >= 2 ** 32:
+            raise ValueError("identifier index would exceed 4 GB")
+        
+        header = cls.HEADER.pack(cls.MAGIC, sys.byteorder[0].encode(), stat.st_size, stat.st_mtime_ns, digest,
+                                 len(matcher.identifiers), len(identifier_table), len(head_table),
+                                 matcher.max_length, len(leading))
+        
+        # Write to a temporary file first so readers never see a partial index
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(header)
+            f.write(leading)
+            f.write(bytes(cls._align(len(header) + len(leading)) - len(header) - len(leading)))
+            f.write(identifier_table.tobytes())
+            f.write(head_table.tobytes())
+            f.write(blob)
+        os.replace(temp_path, path)
+    
+    def update_source(self, stat):
+        """
+        Record a new size and mtime for an unchanged source (e.g. after touch).
+        
+        :param stat: os.stat_result of the identifiers file
+        """
+        with open(self.path, 'r+b') as f:
+            f.seek(9)
+            f.write(struct.pack('<QQ', stat.st_size, stat.st_mtime_ns))
+        self.source_size = stat.st_size
+        self.source_mtime_ns = stat.st_mtime_ns
+
+
+class IndexedIdentifierSet:
+    """
+    Set-like view of the identifiers in an IdentifierIndex; identifiers added
+    at runtime (e.g. detected emails) are kept in memory.
+    """
+    
+    def __init__(self, index):
+        """
+        :param index: IdentifierIndex to read from
+        """
+        self.index = index
+        self.added = set()
+    
+    def __contains__(self, identifier):
+        return identifier in self.added or identifier in self.index
+    
+    def __len__(self):
+        return self.index.count + len(self.added)
+    
+    def __iter__(self):
+        yield from self.index
+        yield from self.added
+    
+    def add(self, identifier):
+        """
+        Add a normalized identifier in memory.
+        
+        :param identifier: Normalized identifier
+        """
+        if identifier not in self.index:
+            self.added.add(identifier)
+
+
+class IndexedHeads(dict):
+    """
+    Head -> lengths mapping that falls back to an IdentifierIndex for heads
+    not added at runtime.
+    """
+    
+    def __init__(self, index):
+        """
+        :param index: IdentifierIndex to read from
+        """
+        super().__init__()
+        self.index = index
+    
+    def get(self, head, default=None):
+        lengths = dict.get(self, head)
+        if lengths is None:
+            lengths = self.index.head_lengths(head)
+        return default if lengths is None else lengths
+
+
+def _lock_exclusive(f, path):
+    """
+    Take an exclusive lock on an open file, waiting while another process
+    holds it. The lock is released when the file is closed.
+    
+    :param f: File opened for appending
+    :param path: Path of the store, for the waiting message
+    """
+    if fcntl is None:
+        # msvcrt retries for about ten seconds before raising OSError
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        return
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print(f"Waiting for another process writing to mapping store {path}...")
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+
+class MappingLog:
+    """
+    Mapping store kept as an append-only log of JSON lines.
+    
+    The log is replayed into memory on open; every run appends only the
+    mappings it created. Writers hold an exclusive lock on PATH.lock from
+    their first new code until the commit, so two processes never hand out
+    the same code. A torn last line (e.g. after a crash) is ignored when
+    reading and only cut off by a writer holding the lock.
+    """
+    
+    def __init__(self, path):
+        """
+        Open (or create) a mapping log.
+        
+        :param path: Path of the log file
+        """
+        self.path = path
+        self._words = {}
+        self._codes = {}
+        self._normalized = {}
+        self._emails = {}
+        self.next_code_index = 1
+        self._staged = []
+        self._staged_codes = set()
+        # Bytes of the log replayed so far, and the writer lock while held
+        self._offset = 0
+        self._lock = None
+        self._replay()
+    
+    def __getstate__(self):
+        # Worker processes only read; the writer lock stays with the parent
+        state = self.__dict__.copy()
+        state['_lock'] = None
+        return state
+    
+    def _replay(self, repair=False):
+        """
+        Read the records appended since the last replay.
+        
+        :param repair: Whether to cut off a torn last line (only under the writer lock)
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        valid = data.rfind(b'\n') + 1
+        if repair and valid < len(data):
+            print(f"Warning: Dropping a torn last line ({len(data) - valid} bytes) from mapping log {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(self._offset + valid)
+        self._offset += valid
+        if not valid:
+            return
+        
+        # Parse all records in one call rather than line by line
+        records = json.loads(b'[' + data[:valid].rstrip(b'\n').replace(b'\n', b',') + b']')
+        for record in records:
+            if 'word' in record:
+                self._add(record['word'], record['code'])
+            elif 'email' in record:
+                self._emails[record['email']] = None
+            elif 'next_code_index' in record:
+                self.next_code_index = record['next_code_index']
+    
+    def _acquire(self):
+        """
+        Take the writer lock and catch up with what other writers appended.
+        """
+        if self._lock is not None:
+            return
+        self._lock = open(self.path + '.lock', 'a')
+        _lock_exclusive(self._lock, self.path)
+        self._replay(repair=True)
+    
+    def _release(self):
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+    
+    def _add(self, word, code):
+        self._words[word] = code
+        self._codes.setdefault(code, word)
+        self._normalized.setdefault(_normalize(word), code)
+    
+    def __len__(self):
+        return len(self._codes) + len(self._staged_codes)
+    
+    def code_for(self, normalized):
+        return self._normalized.get(normalized)
+    
+    def word_for(self, code):
+        return self._codes.get(code)
+    
+    def items(self):
+        """
+        :return: Iterator of (word, code) pairs in the order they were stored
+        """
+        return iter(self._words.items())
+    
+    def emails(self):
+        """
+        :return: List of stored detected emails
+        """
+        return list(self._emails)
+    
+    def allocate(self, normalized, word):
+        """
+        Return the code for a normalized word that had none when looked up,
+        creating one under the writer lock. Another writer may have added
+        the word in the meantime; its code is returned then.
+        
+        :param normalized: Normalized word or phrase
+        :param word: Word or phrase as it appeared in the text (appended by stage())
+        :return: Code for the word
+        """
+        self._acquire()
+        code = self._normalized.get(normalized)
+        if code is None:
+            code = _format_code(self.next_code_index)
+            self.next_code_index += 1
+        return code
+    
+    def stage(self, word, code):
+        """
+        Remember a mapping to be appended by the next commit.
+        
+        :param word: Word or phrase as it appeared in the text
+        :param code: Its code
+        """
+        if word in self._words:
+            return
+        if code not in self._codes:
+            self._staged_codes.add(code)
+        self._staged.append((word, code))
+    
+    def commit(self, emails):
+        """
+        Append the staged mappings and new detected emails, then release the
+        writer lock.
+        
+        :param emails: Detected emails of the run
+        :return: Number of mappings appended
+        """
+        self._acquire()
+        staged = self._staged
+        lines = [json.dumps({'word': word, 'code': code}, ensure_ascii=False) for word, code in staged]
+        lines += [json.dumps({'email': email}, ensure_ascii=False) for email in emails if email not in self._emails]
+        lines.append(json.dumps({'next_code_index': self.next_code_index}))
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        with open(self.path, 'ab') as f:
+            f.write(data)
+        self._offset += len(data)
+        self._release()
+        
+        for word, code in staged:
+            self._add(word, code)
+        for email in emails:
+            self._emails[email] = None
+        self._staged = []
+        self._staged_codes = set()
+        return len(staged)
+    
+    def close(self):
+        self._release()
+
+
+class SQLiteMappingStore:
+    """
+    Mapping store in an SQLite database. Lookups go through indexes, so the
+    mapping is never loaded into memory as a whole.
+    
+    Each code is created in its own write transaction that re-reads the
+    counter, and the codes table makes codes and normalized words unique, so
+    processes sharing the database never hand out the same code twice.
+    """
+    
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS mappings (
+            seq INTEGER PRIMARY KEY,
+            word TEXT NOT NULL UNIQUE,
+            normalized TEXT NOT NULL,
+            code TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS mappings_normalized ON mappings (normalized);
+        CREATE INDEX IF NOT EXISTS mappings_code ON mappings (code);
+        CREATE TABLE IF NOT EXISTS codes (
+            code TEXT PRIMARY KEY,
+            normalized TEXT NOT NULL UNIQUE,
+            word TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS emails (email TEXT PRIMARY KEY);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+    '''
+    
+    def __init__(self, path):
+        """
+        Open (or create) a mapping database.
+        
+        :param path: Path of the database file
+        """
+        self.path = path
+        # Access is serialized by the caller (e.g. the server's worker thread);
+        # transactions are explicit, and other writers are waited for
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        # Every new code is a transaction; WAL keeps those cheap and lets readers run alongside
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(self.SCHEMA)
+        if self._db.execute("SELECT 1 FROM codes LIMIT 1").fetchone() is None:
+            # Stores written before the codes table existed fill it from the mappings
+            self._transaction(self._migrate)
+        self.next_code_index = self._read_next_code_index()
+        self._count = self._db.execute("SELECT COUNT(*) FROM codes").fetchone()[0]
+        self._staged = []
+        self._staged_words = set()
+    
+    def __getstate__(self):
+        # Worker processes reopen the database instead of copying the connection
+        return {'path': self.path}
+    
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+    
+    def __len__(self):
+        return self._count
+    
+    def _transaction(self, function, *args):
+        """
+        Run a function in a write transaction, taking the database's write
+        lock up front so the reads inside it are current.
+        
+        :param function: Function to run
+        :return: Return value of the function
+        """
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            result = function(*args)
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        self._db.execute('COMMIT')
+        return result
+    
+    def _migrate(self):
+        self._db.execute("INSERT OR IGNORE INTO codes (code, normalized, word) "
+                         "SELECT code, normalized, word FROM mappings ORDER BY seq")
+    
+    def _read_next_code_index(self):
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'next_code_index'").fetchone()
+        return row[0] if row else 1
+    
+    def code_for(self, normalized):
+        row = self._db.execute("SELECT code FROM codes WHERE normalized = ?", (normalized,)).fetchone()
+        return row and row[0]
+    
+    def word_for(self, code):
+        row = self._db.execute("SELECT word FROM codes WHERE code = ?", (code,)).fetchone()
+        return row and row[0]
+    
+    def items(self):
+        """
+        :return: Iterator of (word, code) pairs in the order they were stored
+        """
+        return self._db.execute("SELECT word, code FROM mappings ORDER BY seq")
+    
+    def emails(self):
+        """
+        :return: List of stored detected emails
+        """
+        return [row[0] for row in self._db.execute("SELECT email FROM emails ORDER BY rowid")]
+    
+    def allocate(self, normalized, word):
+        """
+        Return the code for a normalized word that had none when looked up,
+        creating one in a write transaction. Another process may have added
+        the word in the meantime; its code is returned then.
+        
+        :param normalized: Normalized word or phrase
+        :param word: Word or phrase as it appeared in the text
+        :return: Code for the word
+        """
+        return self._transaction(self._allocate, normalized, word)
+    
+    def _allocate(self, normalized, word):
+        code = self.code_for(normalized)
+        if code is not None:
+            return code
+        number = self._read_next_code_index()
+        code = _format_code(number)
+        self._db.execute("INSERT INTO codes (code, normalized, word) VALUES (?, ?, ?)", (code, normalized, word))
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('next_code_index', ?)", (number + 1,))
+        self.next_code_index = number + 1
+        self._count += 1
+        return code
+    
+    def stage(self, word, code):
+        """
+        Remember a mapping to be inserted by the next commit.
+        
+        :param word: Word or phrase as it appeared in the text
+        :param code: Its code
+        """
+        if word in self._staged_words or self._db.execute(
+                "SELECT 1 FROM mappings WHERE word = ?", (word,)).fetchone():
+            return
+        self._staged.append((word, _normalize(word), code))
+        self._staged_words.add(word)
+    
+    def commit(self, emails):
+        """
+        Insert the staged mappings and new detected emails in one transaction.
+        
+        :param emails: Detected emails of the run
+        :return: Number of mappings inserted
+        """
+        def insert():
+            # Another process may have stored the same case variant meanwhile
+            before = self._db.total_changes
+            self._db.executemany("INSERT OR IGNORE INTO mappings (word, normalized, code) VALUES (?, ?, ?)",
+                                 self._staged)
+            inserted = self._db.total_changes - before
+            self._db.executemany("INSERT OR IGNORE INTO emails (email) VALUES (?)", ((email,) for email in emails))
+            return inserted
+        
+        inserted = self._transaction(insert)
+        self._staged = []
+        self._staged_words = set()
+        return inserted
+    
+    def close(self):
+        self._db.close()
+
+
+def open_mapping_store(path):
+    """
+    Open a mapping store, choosing the backend by file extension:
+    .db, .sqlite and .sqlite3 are SQLite databases, anything else is a log.
+    
+    :param path: Path of the store
+    :return: SQLiteMappingStore or MappingLog
+    """
+    if os.path.splitext(path)[1].lower() in ('.db', '.sqlite', '.sqlite3'):
+        return SQLiteMappingStore(path)
+    return MappingLog(path)
+
+
+class StoredCodes:
+    """
+    Dict-like view of one direction of a mapping store (normalized item ->
+    code, or code -> word); entries set at runtime are kept in memory.
+    """
+    
+    def __init__(self, store, lookup):
+        """
+        :param store: Mapping store to read from
+        :param lookup: Store method that looks up a key (code_for or word_for)
+        """
+        self.store = store
+        self.lookup = lookup
+        self.added = {}
+    
+    def get(self, key, default=None):
+        value = self.added.get(key)
+        if value is None:
+            value = self.lookup(key)
+        return default if value is None else value
+    
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+    
+    def __setitem__(self, key, value):
+        self.added[key] = value
+    
+    def __contains__(self, key):
+        return self.get(key) is not None
+    
+    def __len__(self):
+        return len(self.store)
+
+
+class CodeMap:
+    """
+    Compact bidirectional mapping between words and generated codes, used
+    through the word_to_code, code_to_word and normalized_to_code views.
+    
+    Words are stored once, as UTF-8 in one arena with an array of offsets,
+    and codes as their number, so an entry takes a few dozen bytes instead of
+    separate string objects in three dicts. The normalized direction is
+    derived from code_to_word. Words and normalized words are found through
+    open-addressing tables of integers keyed by CRC32 (as in IdentifierIndex)
+    that are built on first use. Only codes of the generated shape fit.
+    """
+    
+    def __init__(self):
+        self._arena = bytearray()
+        # Word id -> start offset in the arena; the last entry is the end
+        self._offsets = array('Q', [0])
+        # Word id -> code number, 0 for words only stored as a code_to_word value
+        self._word_codes = array('I')
+        # Code number -> word id + 1, 0 for unused numbers
+        self._code_words = array('I', [0])
+        self.word_count = 0
+        self.code_count = 0
+        # Lookup tables and the CRC32 per word id / code number, built on first use
+        self._word_table = None
+        self._word_hashes = None
+        self._normalized_table = None
+        self._normalized_hashes = None
+    
+    def __getstate__(self):
+        # Lookup tables are rebuilt on first use instead of being copied
+        state = self.__dict__.copy()
+        state.update(_word_table=None, _word_hashes=None, _normalized_table=None, _normalized_hashes=None)
+        return state
+    
+    @classmethod
+    def from_dicts(cls, word_to_code, code_to_word, normalized_to_code=None):
+        """
+        Build a CodeMap from the dicts of a replacement file.
+        
+        :param word_to_code: Dict of word -> code
+        :param code_to_word: Dict of code -> word
+        :param normalized_to_code: Dict of normalized word -> code, or None to derive it
+        :return: CodeMap, or None if the mapping does not fit (codes of another
+                 shape, codes out of order, or normalized entries that do not
+                 follow from code_to_word)
+        """
+        numbers = _code_numbers(code_to_word)
+        if numbers is None or not all(map(int.__lt__, numbers, islice(numbers, 1, None))):
+            return None
+        word_numbers = _code_numbers(word_to_code.values())
+        if word_numbers is None:
+            return None
+        if normalized_to_code is not None:
+            derived = zip(map(_normalize, code_to_word.values()), code_to_word)
+            if (len(normalized_to_code) != len(code_to_word)
+                    or not all(map(tuple.__eq__, normalized_to_code.items(), derived))):
+                return None
+        
+        codes = cls()
+        codes._arena = bytearray(''.join(word_to_code).encode('utf-8'))
+        codes._offsets = array('Q', accumulate(map(len, map(str.encode, word_to_code)), initial=0))
+        codes._word_codes = word_codes = array('I', word_numbers)
+        codes.word_count = len(word_codes)
+        
+        # code_to_word normally holds the first word stored with each code
+        code_words = array('I', bytes(4 * (max(chain(numbers, word_numbers), default=0) + 1)))
+        get = code_to_word.get
+        for word_id, (word, code), number in zip(range(len(word_codes)), word_to_code.items(), word_numbers):
+            if not code_words[number] and get(code) == word:
+                code_words[number] = word_id + 1
+        for number, word in zip(numbers, code_to_word.values()):
+            if not code_words[number]:
+                code_words[number] = codes._append(word) + 1
+        codes._code_words = code_words
+        codes.code_count = len(numbers)
+        return codes
+    
+    def views(self):
+        """
+        Return the dict-like views of the mapping.
+        
+        :return: Tuple of (word_to_code, code_to_word, normalized_to_code) CodeMapViews
+        """
+        return (CodeMapView(self, self.word_code, self.set_word_code, self.word_items, self.word_size),
+                CodeMapView(self, self.code_word, self.set_code_word, self.code_items, self.code_size),
+                CodeMapView(self, self.normalized_code, self.set_normalized_code, self.normalized_items,
+                            self.code_size))
+    
+    @staticmethod
+    def _number(code):
+        """
+        Return the number of a code, which must have the generated shape.
+        
+        :param code: Code
+        :return: Code number
+        """
+        number = _code_number(code)
+        if number is None:
+            raise ValueError(f"'{code}' is not a generated code")
+        return number
+    
+    @staticmethod
+    def _build_table(entries, count):
+        """
+        Build an open-addressing table with a load factor of at most 0.5.
+        
+        :param entries: Iterable of (value, crc32) pairs, values > 0
+        :param count: Number of entries
+        :return: Array of values, 0 for empty slots
+        """
+        table = array('I', bytes(4 * IdentifierIndex._slot_count(count)))
+        mask = len(table) - 1
+        for value, crc in entries:
+            slot = crc & mask
+            while table[slot]:
+                slot = (slot + 1) & mask
+            table[slot] = value
+        return table
+    
+    @staticmethod
+    def _add_to_table(table, value, crc):
+        """
+        Add a value to an open-addressing table.
+        
+        :param table: Array of values
+        :param value: Value to add (> 0)
+        :param crc: CRC32 of its key
+        """
+        mask = len(table) - 1
+        slot = crc & mask
+        while table[slot]:
+            slot = (slot + 1) & mask
+        table[slot] = value
+    
+    def _word(self, word_id):
+        """
+        Decode a word from the arena.
+        
+        :param word_id: Word id
+        :return: Word
+        """
+        offsets = self._offsets
+        return self._arena[offsets[word_id]:offsets[word_id + 1]].decode('utf-8')
+    
+    def _append(self, word, data=None):
+        """
+        Store a word in the arena.
+        
+        :param word: Word
+        :param data: Word encoded as UTF-8, if already available
+        :return: New word id
+        """
+        if data is None:
+            data = word.encode('utf-8')
+        self._arena += data
+        self._offsets.append(len(self._arena))
+        self._word_codes.append(0)
+        if self._word_hashes is not None:
+            self._word_hashes.append(zlib.crc32(data))
+        return len(self._word_codes) - 1
+    
+    def _find_word(self, data):
+        """
+        Find a word of word_to_code.
+        
+        :param data: Word encoded as UTF-8
+        :return: Word id, or None
+        """
+        if self._word_table is None:
+            arena, offsets = self._arena, self._offsets
+            if self._word_hashes is None:
+                self._word_hashes = array('I', (zlib.crc32(arena[offsets[word_id]:offsets[word_id + 1]])
+                                                for word_id in range(len(self._word_codes))))
+            hashes = self._word_hashes
+            self._word_table = self._build_table(
+                ((word_id + 1, hashes[word_id]) for word_id, number in enumerate(self._word_codes) if number),
+                self.word_count)
+        table, hashes = self._word_table, self._word_hashes
+        arena, offsets = self._arena, self._offsets
+        crc = zlib.crc32(data)
+        mask = len(table) - 1
+        slot = crc & mask
+        while True:
+            value = table[slot]
+            if not value:
+                return None
+            word_id = value - 1
+            if hashes[word_id] == crc and arena[offsets[word_id]:offsets[word_id + 1]] == data:
+                return word_id
+            slot = (slot + 1) & mask
+    
+    def word_code(self, word):
+        """
+        Look up the code of a word.
+        
+        :param word: Word as it appeared in the text
+        :return: Code, or None
+        """
+        word_id = self._find_word(word.encode('utf-8'))
+        return None if word_id is None else _format_code(self._word_codes[word_id])
+    
+    def set_word_code(self, word, code):
+        """
+        Set the code of a word.
+        
+        :param word: Word as it appeared in the text
+        :param code: Generated code
+        """
+        number = self._number(code)
+        data = word.encode('utf-8')
+        word_id = self._find_word(data)
+        if word_id is not None:
+            self._word_codes[word_id] = number
+            return
+        
+        # Usually the word was just stored as the code_to_word value of a new code
+        last = len(self._word_codes) - 1
+        if last >= 0 and not self._word_codes[last] and self._arena[self._offsets[last]:] == data:
+            word_id = last
+        else:
+            word_id = self._append(word, data)
+        self._register_word(word_id, number)
+    
+    def _register_word(self, word_id, number):
+        """
+        Add a stored word to word_to_code.
+        
+        :param word_id: Id of a word that is not in word_to_code yet
+        :param number: Code number
+        """
+        self._word_codes[word_id] = number
+        self.word_count += 1
+        table = self._word_table
+        if table is None or self.word_count * 2 > len(table):
+            self._word_table = None
+        else:
+            self._add_to_table(table, word_id + 1, self._word_hashes[word_id])
+    
+    def word_items(self):
+        """
+        Iterate over word_to_code in insertion order.
+        
+        :return: Iterator of (word, code) tuples
+        """
+        arena, offsets = self._arena, self._offsets
+        for word_id, number in enumerate(self._word_codes):
+            if number:
+                yield arena[offsets[word_id]:offsets[word_id + 1]].decode('utf-8'), f'X{number:02d}'
+    
+    def word_size(self):
+        return self.word_count
+    
+    def code_word(self, code):
+        """
+        Look up the word of a code.
+        
+        :param code: Code
+        :return: Word, or None
+        """
+        number = _code_number(code)
+        if number is None or number >= len(self._code_words):
+            return None
+        value = self._code_words[number]
+        return self._word(value - 1) if value else None
+    
+    def set_code_word(self, code, word):
+        """
+        Set the word of a code.
+        
+        :param code: Generated code
+        :param word: Word as it appeared in the text
+        """
+        self._store_code(self._number(code), self._append(word), _normalize(word))
+    
+    def _store_code(self, number, word_id, key):
+        """
+        Point a code at a stored word and keep the normalized table in sync.
+        
+        :param number: Code number
+        :param word_id: Word id
+        :param key: Normalized word
+        """
+        code_words = self._code_words
+        hashes = self._normalized_hashes
+        if number >= len(code_words):
+            missing = bytes(4 * (number + 1 - len(code_words)))
+            code_words.frombytes(missing)
+            if hashes is not None:
+                hashes.frombytes(missing)
+        previous = code_words[number]
+        code_words[number] = word_id + 1
+        if not previous:
+            self.code_count += 1
+        
+        if hashes is not None:
+            crc = hashes[number] = zlib.crc32(key.encode('utf-8'))
+            table = self._normalized_table
+            if table is None or previous or self.code_count * 2 > len(table):
+                self._normalized_table = None
+            else:
+                self._add_to_table(table, number, crc)
+    
+    def add_code(self, code, word, key):
+        """
+        Store a new code in all directions at once, as code_to_word[code] = word,
+        normalized_to_code[key] = code, and word_to_code[word] = code unless
+        the word already has a code.
+        
+        :param code: New generated code
+        :param word: Word as it appeared in the text
+        :param key: Normalized word
+        """
+        number = self._number(code)
+        data = word.encode('utf-8')
+        new_word = self._find_word(data) is None
+        word_id = self._append(word, data)
+        self._store_code(number, word_id, key)
+        if new_word:
+            self._register_word(word_id, number)
+    
+    def add_word(self, word, code):
+        """
+        Store a word in word_to_code unless it already has a code, as one
+        lookup instead of a membership test and an assignment.
+        
+        :param word: Word as it appeared in the text
+        :param code: Generated code
+        :return: True if the word was added
+        """
+        data = word.encode('utf-8')
+        if self._find_word(data) is not None:
+            return False
+        self._register_word(self._append(word, data), self._number(code))
+        return True
+    
+    def code_items(self):
+        """
+        Iterate over code_to_word in code order.
+        
+        :return: Iterator of (code, word) tuples
+        """
+        arena, offsets = self._arena, self._offsets
+        for number, value in enumerate(self._code_words):
+            if value:
+                yield f'X{number:02d}', arena[offsets[value - 1]:offsets[value]].decode('utf-8')
+    
+    def code_size(self):
+        return self.code_count
+    
+    def normalized_code(self, key):
+        """
+        Look up the code of a normalized word.
+        
+        :param key: Normalized word
+        :return: Code, or None
+        """
+        code_words = self._code_words
+        if self._normalized_table is None:
+            if self._normalized_hashes is None:
+                hashes = array('I', bytes(4 * len(code_words)))
+                for number, value in enumerate(code_words):
+                    if value:
+                        hashes[number] = zlib.crc32(_normalize(self._word(value - 1)).encode('utf-8'))
+                self._normalized_hashes = hashes
+            hashes = self._normalized_hashes
+            self._normalized_table = self._build_table(
+                ((number, hashes[number]) for number, value in enumerate(code_words) if value), self.code_count)
+        table, hashes = self._normalized_table, self._normalized_hashes
+        crc = zlib.crc32(key.encode('utf-8'))
+        mask = len(table) - 1
+        slot = crc & mask
+        while True:
+            number = table[slot]
+            if not number:
+                return None
+            if hashes[number] == crc and _normalize(self._word(code_words[number] - 1)) == key:
+                return _format_code(number)
+            slot = (slot + 1) & mask
+    
+    def set_normalized_code(self, key, code):
+        """
+        Accept a normalized entry; it already follows from code_to_word, so
+        only the code is checked.
+        
+        :param key: Normalized word
+        :param code: Code whose word was already set in code_to_word
+        """
+        number = self._number(code)
+        if number >= len(self._code_words) or not self._code_words[number]:
+            raise ValueError(f"code '{code}' has no word in code_to_word")
+    
+    def normalized_items(self):
+        """
+        Iterate over normalized_to_code in code order.
+        
+        :return: Iterator of (normalized word, code) tuples
+        """
+        for code, word in self.code_items():
+            yield _normalize(word), code
+
+
+class CodeMapView:
+    """
+    Dict-like view of one direction of a CodeMap (word -> code, code -> word,
+    or normalized word -> code).
+    """
+    
+    def __init__(self, codes, lookup, assign, items, size):
+        """
+        :param codes: CodeMap the view belongs to
+        :param lookup: CodeMap method that looks up a key
+        :param assign: CodeMap method that sets a key
+        :param items: CodeMap method that iterates over the (key, value) pairs
+        :param size: CodeMap method that returns the number of entries
+        """
+        self.codes = codes
+        self.lookup = lookup
+        self.assign = assign
+        self._items = items
+        self.size = size
+    
+    def get(self, key, default=None):
+        value = self.lookup(key)
+        return default if value is None else value
+    
+    def __getitem__(self, key):
+        value = self.lookup(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+    
+    def __setitem__(self, key, value):
+        self.assign(key, value)
+    
+    def __contains__(self, key):
+        return self.lookup(key) is not None
+    
+    def __len__(self):
+        return self.size()
+    
+    def __iter__(self):
+        return (key for key, _ in self._items())
+    
+    def __eq__(self, other):
+        if isinstance(other, CodeMapView):
+            other = dict(other.items())
+        return dict(self.items()) == other
+    
+    def items(self):
+        return self._items()
+    
+    def keys(self):
+        return iter(self)
+    
+    def values(self):
+        return (value for _, value in self._items())
+
+
+class Metrics:
+    """
+    Stage timings and counters collected by a TextAnonymizer with profiling on.
+    
+    Instrumented code only checks whether a Metrics object is present, once
+    per stage and chunk, so disabled profiling costs next to nothing.
+    """
+    
+    def __init__(self):
+        # Stage -> [seconds, calls], in order of first use
+        self.stages = {}
+        self.counters = {}
+    
+    def add_time(self, stage, seconds):
+        """
+        Add the time spent in one call of a stage.
+        
+        :param stage: Stage name
+        :param seconds: Elapsed time
+        """
+        entry = self.stages.get(stage)
+        if entry is None:
+            self.stages[stage] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+    
+    def count(self, name, amount=1):
+        """
+        Increase a counter.
+        
+        :param name: Counter name
+        :param amount: Amount to add
+        """
+        self.counters[name] = self.counters.get(name, 0) + amount
+    
+    def set(self, name, value):
+        """
+        Set a counter to a current value (e.g. the mapping size).
+        
+        :param name: Counter name
+        :param value: Value
+        """
+        self.counters[name] = value
+    
+    def report(self):
+        """
+        Return the collected metrics.
+        
+        :return: Dictionary with per-stage timings, counters and throughput
+        """
+        total = sum(seconds for seconds, _ in self.stages.values())
+        megabytes = self.counters.get('bytes_in', 0) / (1024 * 1024)
+        return {
+            'total_seconds': round(total, 6),
+            'mb_per_s': round(megabytes / total, 3) if total else 0.0,
+            'stages': {stage: {'seconds': round(seconds, 6), 'calls': calls,
+                               'share': round(seconds / total, 4) if total else 0.0}
+                       for stage, (seconds, calls) in self.stages.items()},
+            'counters': dict(self.counters),
+        }
+    
+    def print_report(self):
+        """
+        Print the collected metrics as a table.
+        """
+        report = self.report()
+        print("Profile:")
+        print(f"  {'Stage':<20} {'Seconds':>10} {'Calls':>7} {'Share':>7}")
+        for stage, entry in report['stages'].items():
+            print(f"  {stage:<20} {entry['seconds']:>10.4f} {entry['calls']:>7} {entry['share']:>7.1%}")
+        print(f"  {'total':<20} {report['total_seconds']:>10.4f}")
+        for name, value in report['counters'].items():
+            print(f"  {name:<20} {value:>10}")
+        if report['counters'].get('bytes_in'):
+            print(f"  Throughput: {report['mb_per_s']:.2f} MB/s")
+
+
 class TextAnonymizer:
-    def __init__(self, identifiers_file='identifiers.txt', replacements_dir='replacements'):
+    def __init__(self, identifiers_file='identifiers.txt', replacements_dir='replacements', use_index=True,
+                 mapping_store=None, profile=False):
+        """
+        Initialize the anonymizer with identifiers file and replacements directory.
+        
+        :param identifiers_file: Text file containing words to anonymize (one per line)
+        :param replacements_dir: Directory to store replacement files
+        :param use_index: Whether to use (and maintain) the compiled index next to the identifiers file
+        :param mapping_store: Path of a persistent mapping store (SQLite or log) to use instead
+                              of writing a replacement file per run
+        :param profile: Whether to collect stage timings and counters in self.metrics
+        """
+        self.identifiers_file = identifiers_file
+        self.use_index = use_index
+        self.replacements_dir = replacements_dir
+        # Item -> code, code -> item and normalized (casefolded) item -> code, for
+        # constant-time lookups of case variants
+        self.word_to_code = {}
+        self.code_to_word = {}
+        self.normalized_to_code = {}
+        # CodeMap behind the three mappings once they hold code_map_min_entries
+        # codes (None: plain dicts); None as the threshold keeps the dicts
+        self._code_map = None
+        self.code_map_min_entries = CODE_MAP_MIN_ENTRIES
+        self.current_code_index = 1
+        self.identifiers = set()
+        self._matcher = None
+        self.last_replacement_file = None
+        # Replacement file path -> (mtime, size, code_to_word, metadata, pattern),
+        # least recently used first, with at most mapping_cache_size entries
+        self._code_matchers = {}
+        self.mapping_cache_size = MAPPING_CACHE_SIZE
+        self.mapping_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        # Stage timings and counters, only collected when profiling
+        self.metrics = Metrics() if profile else None
+        
+        # With a mapping store the code space continues across runs and only
+        # new mappings are written
+        self.mapping_store = None
+        if mapping_store:
+            self.mapping_store = open_mapping_store(mapping_store)
+            self.normalized_to_code = StoredCodes(self.mapping_store, self.mapping_store.code_for)
+            self.code_to_word = StoredCodes(self.mapping_store, self.mapping_store.word_for)
+            self.current_code_index = self.mapping_store.next_code_index
+            print(f"Loaded mapping store {mapping_store} ({len(self.mapping_store)} codes)")
+        
+        # Create replacements directory if it doesn't exist
+        if not os.path.exists(replacements_dir):
+            os.makedirs(replacements_dir)
+        
+        # Load identifiers from file
+        start = time.perf_counter()
+        self._load_identifiers()
+        if self.metrics is not None:
+            self.metrics.add_time('load_identifiers', time.perf_counter() - start)
+            self.metrics.set('identifiers', len(self.identifiers))
+    
+    def _load_identifiers(self):
+        """
+        Load identifiers from the identifiers file.
+        """
+        if not os.path.exists(self.identifiers_file):
+            print(f"Warning: Identifiers file '{self.identifiers_file}' not found.")
+            print("Please create this file with one identifier per line.")
+            return
+        
+        try:
+            stat = os.stat(self.identifiers_file)
+            index_file = self.identifiers_file + INDEX_SUFFIX
+            index = None
+            if self.use_index and os.path.exists(index_file):
+                try:
+                    index = IdentifierIndex(index_file)
+                except (OSError, ValueError, struct.error):
+                    index = None
+            
+            if index is not None and index.matches_source(stat):
+                self._use_index(index)
+                print(f"Loaded {len(self.identifiers)} identifiers from {self.identifiers_file} (compiled index)")
+                return
+            
+            with open(self.identifiers_file, 'rb') as f:
+                raw = f.read()
+            digest = hashlib.sha256(raw).digest()
+            
+            if index is not None and index.source_digest == digest:
+                # Only the timestamp changed
+                index.update_source(stat)
+                self._use_index(index)
+                print(f"Loaded {len(self.identifiers)} identifiers from {self.identifiers_file} (compiled index)")
+                return
+            
+            text = raw.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+            for line in text.split('\n'):
+                identifier = line.strip()
+                if identifier and not identifier.startswith('#'):  # Skip empty lines and comments
+                    self.identifiers.add(_normalize(identifier))
+            print(f"Loaded {len(self.identifiers)} identifiers from {self.identifiers_file}")
+        except Exception as e:
+            print(f"Error loading identifiers file: {e}")
+            sys.exit(1)
+        
+        if self.use_index and len(self.identifiers) >= INDEX_MAP_MIN_IDENTIFIERS:
+            try:
+                IdentifierIndex.write(index_file, self._get_matcher(), stat, digest)
+                # Continue on the mapped index, so the parsed set can be freed
+                self.identifiers = IndexedIdentifierSet(IdentifierIndex(index_file))
+                self._matcher = None
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not write identifier index '{index_file}': {e}")
+    
+    def _use_index(self, index):
+        """
+        Take the identifiers from a compiled index that matches the identifiers file.
+        
+        Lists of INDEX_MAP_MIN_IDENTIFIERS and more are served from the mapped
+        index. Smaller lists are read into a set, because probing the mapped
+        tables for every token matches much slower than a set and dict lookup.
+        
+        :param index: Current IdentifierIndex
+        """
+        if index.count >= INDEX_MAP_MIN_IDENTIFIERS:
+            self.identifiers = IndexedIdentifierSet(index)
+        else:
+            self.identifiers = set(index)
+    
+    def _find_email_spans(self, text, pos=0, endpos=None):
+        """
+        Find the positions of email addresses in the text using the precompiled detector.
+        
+        :param text: Input text, or ASCII bytes (e.g. a region of a mapped file)
+        :param pos: Position to start searching from
+        :param endpos: Only return emails starting before this position (default: end of text)
+        :return: Sorted list of (start_pos, end_pos) tuples
+        """
+        if endpos is None:
+            endpos = len(text)
+        # An email starting before endpos, and the lookarounds that decide
+        # it, never reach past this limit
+        limit = endpos + EMAIL_MAX_LENGTH + 1
+        
+        spans = []
+        if isinstance(text, str):
+            search, at_sign, space, newline = EMAIL_PATTERN.search, '@', ' ', '\n'
+        else:
+            search, at_sign, space, newline = EMAIL_BYTES_PATTERN.search, b'@', b' ', b'\n'
+        
+        # Every email contains an '@', so the regex only has to run from the
+        # start of the word before the next one; text without any '@' is
+        # skipped entirely
+        at = text.find(at_sign, pos, limit)
+        while at != -1:
+            start = max(pos, at - EMAIL_MAX_LENGTH)
+            start = max(start, text.rfind(space, start, at) + 1, text.rfind(newline, start, at) + 1)
+            match = search(text, start, limit)
+            if match is None or match.start() >= endpos:
+                break
+            spans.append(match.span())
+            pos = match.end()
+            at = text.find(at_sign, pos, limit)
+        
+        return spans
+    
+    def _find_email_addresses(self, text):
+        """
+        Find email addresses in the text using comprehensive pattern.
+        
+        :param text: Input text
+        :return: List of email addresses found
+        """
+        return list(set(text[start:end] for start, end in self._find_email_spans(text)))
+    
+    def _generate_replacement_filename(self, input_filename):
+        """
+        Generate a unique replacement filename with timestamp.
+        
+        :param input_filename: Name of the input file being processed
+        :return: Unique replacement filename
+        """
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        base_name = os.path.splitext(os.path.basename(input_filename))[0]
+        filename = f"replacements_{base_name}_{timestamp}.json"
+        full_path = os.path.join(self.replacements_dir, filename)
+        
+        # Check if file already exists (unlikely but possible)
+        counter = 1
+        while os.path.exists(full_path):
+            filename = f"replacements_{base_name}_{timestamp}_{counter:02d}.json"
+            full_path = os.path.join(self.replacements_dir, filename)
+            counter += 1
+        
+        return full_path
+    
+    def _generate_output_filename(self, input_filename, suffix=""):
+        """
+        Generate output filename based on input filename with timestamp.
+        
+        :param input_filename: Original input filename
+        :param suffix: Optional suffix to add before timestamp
+        :return: Generated output filename
+        """
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        base_name = os.path.splitext(input_filename)[0]
+        extension = os.path.splitext(input_filename)[1]
+        
+        if suffix:
+            return f"{base_name}_{suffix}_{timestamp}{extension}"
+        else:
+            return f"{base_name}_{timestamp}{extension}"
+    
+    def _add_identifier(self, identifier):
+        """
+        Add an identifier, keeping the compiled matcher in sync.
+        
+        :param identifier: Identifier to add
+        """
+        if self._matcher is not None:
+            self._matcher.add(_normalize(identifier))
+        else:
+            self.identifiers.add(_normalize(identifier))
+    
+    def _get_matcher(self):
+        """
+        Return the identifier matcher, building it on first use.
+        
+        :return: IdentifierMatcher over self.identifiers
+        """
+        if self._matcher is None or self._matcher.size != len(self.identifiers):
+            start = time.perf_counter()
+            self._matcher = IdentifierMatcher(self.identifiers)
+            if self.metrics is not None:
+                self.metrics.add_time('build_matcher', time.perf_counter() - start)
+        return self._matcher
+    
+    def load_replacements(self, replacement_file):
+        """
+        Load the mapping from a replacement file, so new codes continue its code space.
+        
+        :param replacement_file: Path to the replacement JSON file
+        """
+        with open(replacement_file, 'r', encoding='utf-8') as f:
+            replacement_data = json.load(f)
+        
+        word_to_code = replacement_data.get('word_to_code', {})
+        code_to_word = replacement_data.get('code_to_word', {})
+        codes = [int(code[1:]) for code in code_to_word if code[1:].isdigit()]
+        self.current_code_index = max(codes, default=0) + 1
+        
+        # Files written before the index existed get it rebuilt
+        normalized_to_code = replacement_data.get('normalized_to_code')
+        if normalized_to_code is None:
+            normalized_to_code = {}
+            for word, code in word_to_code.items():
+                normalized_to_code.setdefault(_normalize(word), code)
+        
+        self.word_to_code = word_to_code
+        self.code_to_word = code_to_word
+        self.normalized_to_code = normalized_to_code
+        self._code_map = None
+        if self.code_map_min_entries is not None and len(code_to_word) >= self.code_map_min_entries:
+            self._compact_mapping()
+        
+        print(f"Loaded {len(self.code_to_word)} codes from {replacement_file}")
+    
+    def _generate_code(self):
+        """
+        Generate a unique code for anonymization.
+        
+        :return: Unique code (X01, X02, etc.)
+        """
+        code = _format_code(self.current_code_index)
+        self.current_code_index += 1
+        return code
+    
+    def _should_anonymize_word(self, word):
+        """
+        Check if a single word should be anonymized based on the identifiers list.
+        
+        :param word: Word to check
+        :return: True if word should be anonymized
+        """
+        return _normalize(word) in self.identifiers
+    
+    def _find_multi_word_matches(self, text):
+        """
+        Find multi-word identifiers in the text.
+        
+        :param text: Input text
+        :return: List of tuples (start_pos, end_pos, original_phrase, identifier)
+        """
+        matches = []
+        for start_pos, end_pos in self._get_matcher().finditer(text):
+            original_phrase = text[start_pos:end_pos]
+            if ' ' in original_phrase:
+                matches.append((start_pos, end_pos, original_phrase, _normalize(original_phrase)))
+        return matches
+    
+    def _get_code(self, item):
+        """
+        Return the code for an item, creating one if it is new.
+        
+        :param item: Word or phrase as it appears in the text
+        :return: Code for the item
+        """
+        # Check if this item (case-insensitive) already has a code
+        key = _normalize(item)
+        code = self.normalized_to_code.get(key)
+        
+        if self._code_map is not None:
+            # All three directions of the CodeMap in one step
+            if code is None:
+                code = self._generate_code()
+                self._code_map.add_code(code, item, key)
+            else:
+                self._code_map.add_word(item, code)
+            return code
+        
+        new_code = code is None
+        if new_code and self.mapping_store is not None:
+            # The store hands out codes, so processes sharing it never reuse one
+            code = self.mapping_store.allocate(key, item)
+            self.current_code_index = self.mapping_store.next_code_index
+            self.code_to_word[code] = item
+            self.normalized_to_code[key] = code
+        elif new_code:
+            # Create new code for this item
+            code = self._generate_code()
+            self.code_to_word[code] = item
+            self.normalized_to_code[key] = code
+        
+        # Store this specific case variant
+        if item not in self.word_to_code:
+            self.word_to_code[item] = code
+            if self.mapping_store is not None:
+                self.mapping_store.stage(item, code)
+        
+        if (new_code and self.mapping_store is None and self.code_map_min_entries is not None
+                and len(self.code_to_word) >= self.code_map_min_entries):
+            self._compact_mapping()
+        return code
+    
+    def _compact_mapping(self):
+        """
+        Move the mapping dicts into a CodeMap, which needs roughly a third of
+        the memory for millions of entries.
+        """
+        mapping = CodeMap.from_dicts(self.word_to_code, self.code_to_word, self.normalized_to_code)
+        if mapping is None:
+            # Custom codes or hand-edited files keep the plain dicts
+            self.code_map_min_entries = None
+            return
+        self._code_map = mapping
+        self.word_to_code, self.code_to_word, self.normalized_to_code = mapping.views()
+    
+    def _find_matches(self, text, pos=0, email_spans=(), endpos=None):
+        """
+        Find identifier matches, letting detected email spans take part in the
+        leftmost-longest selection.
+        
+        :param text: Input text, or ASCII bytes (e.g. a region of a mapped file)
+        :param pos: Position to start scanning from
+        :param email_spans: Sorted (start_pos, end_pos) tuples of detected emails
+        :param endpos: For bytes, position just after a newline to stop scanning at
+        :return: Iterator of non-overlapping (start_pos, end_pos) tuples in text order
+        """
+        matcher = self._get_matcher()
+        if isinstance(text, str):
+            finditer = matcher.finditer
+        else:
+            # Lowercase the region once, for every restart of the scan
+            if endpos is None:
+                endpos = len(text)
+            folded = memoryview(text[pos:endpos].lower())
+            
+            def finditer(data, start, dense=False):
+                return matcher.finditer_bytes(data, start, endpos, folded[start - pos:], dense)
+        matches = finditer(text, pos)
+        match = next(matches, None)
+        last_end = pos
+        
+        for email in email_spans:
+            # Identifier matches before this email (or longer at the same position) win
+            while match is not None and (match[0] < email[0] or (match[0] == email[0] and match[1] >= email[1])):
+                yield match
+                last_end = match[1]
+                match = next(matches, None)
+            if email[0] < last_end:
+                continue
+            
+            yield email
+            last_end = email[1]
+            if match is not None and match[0] < last_end:
+                # Resume the identifier scan after the email; a match was
+                # pending right there, so skip the prefilter for now
+                matches = finditer(text, last_end, True)
+                match = next(matches, None)
+        
+        while match is not None:
+            yield match
+            match = next(matches, None)
+    
+    def _anonymize_chunks(self, chunks, detect_emails, found_items, detected_emails):
+        """
+        Replace identifiers in a stream of text chunks.
+        
+        Text is buffered until enough lookahead is available that no identifier
+        or email can straddle the point where output is flushed, so the result
+        does not depend on how the input is split into chunks.
+        
+        :param chunks: Iterable of text chunks
+        :param detect_emails: Whether to automatically detect and anonymize emails
+        :param found_items: Dict filled with item -> code in order of first appearance
+        :param detected_emails: Dict filled with detected emails in order of detection
+        :return: Generator of anonymized text pieces
+        """
+        metrics = self.metrics
+        buffer = ''
+        # buffer[:pos] is context that has already been written out
+        pos = 0
+        # Email search resumes separately, so it sees the same matches as a single pass
+        email_pos = 0
+        chunks = iter(chunks)
+        final = False
+        
+        while not final:
+            chunk = next(chunks, None)
+            if chunk is None:
+                final = True
+            else:
+                buffer += chunk
+                if metrics is not None:
+                    metrics.count('chunks')
+                    metrics.count('bytes_in', len(chunk.encode('utf-8')))
+            
+            matcher = self._get_matcher()
+            lookahead = max(matcher.max_length, EMAIL_MAX_LENGTH if detect_emails else 0) + 1
+            if final:
+                safe = len(buffer)
+            else:
+                safe = len(buffer) - lookahead
+                if safe <= pos:
+                    continue
+            
+            if metrics is not None:
+                stage_start = time.perf_counter()
+            
+            # Emails starting before the safe point are complete in the buffer
+            email_spans = []
+            if detect_emails:
+                for start, end in self._find_email_spans(buffer, email_pos, safe):
+                    detected_emails[buffer[start:end]] = None
+                    email_pos = max(email_pos, end)
+                    if start >= pos:
+                        email_spans.append((start, end))
+                email_pos = max(email_pos, safe)
+                if metrics is not None:
+                    now = time.perf_counter()
+                    metrics.add_time('email_detection', now - stage_start)
+                    stage_start = now
+            
+            # Every match starting before the safe point is complete in the buffer
+            matches = []
+            for start, end in self._find_matches(buffer, pos, email_spans):
+                if start >= safe:
+                    break
+                matches.append((start, end))
+            
+            # Flush up to a point that does not split a word or a match
+            floor = matches[-1][1] if matches else pos
+            if final:
+                cut = len(buffer)
+            elif floor >= safe:
+                cut = floor
+            else:
+                cut = safe
+                while cut > floor and _is_word_char(buffer[cut - 1]) and _is_word_char(buffer[cut]):
+                    cut -= 1
+                if cut == pos:
+                    continue
+                matches = [match for match in matches if match[0] < cut]
+            
+            if metrics is not None:
+                now = time.perf_counter()
+                metrics.add_time('matching', now - stage_start)
+                stage_start = now
+                self._count_matches(buffer, matches, email_spans)
+            
+            parts = []
+            last_end = pos
+            for start, end in matches:
+                item = buffer[start:end]
+                code = found_items.get(item)
+                if code is None:
+                    # Codes are numbered in order of first appearance
+                    code = found_items[item] = self._get_code(item)
+                parts.append(buffer[last_end:start])
+                parts.append(code)
+                last_end = end
+            parts.append(buffer[last_end:cut])
+            output = ''.join(parts)
+            if metrics is not None:
+                metrics.add_time('rewrite', time.perf_counter() - stage_start)
+                metrics.count('bytes_out', len(output.encode('utf-8')))
+            yield output
+            
+            # Keep one character of context for the word boundary checks
+            keep_from = max(min(cut, email_pos) - 1, 0)
+            buffer = buffer[keep_from:]
+            pos = cut - keep_from
+            email_pos -= keep_from
+    
+    def _count_matches(self, text, matches, email_spans=(), emails=()):
+        """
+        Count matches per kind in the metrics.
+        
+        :param text: Text the matches refer to
+        :param matches: List of (start_pos, end_pos) tuples
+        :param email_spans: Spans that were detected as emails
+        :param emails: Detected email addresses
+        """
+        email_spans = set(email_spans)
+        emails = set(emails)
+        for start, end in matches:
+            item = text[start:end]
+            self._count_item(item, (start, end) in email_spans or item in emails)
+    
+    def _count_item(self, item, is_email):
+        """
+        Count one match by its kind in the metrics.
+        
+        :param item: Matched text
+        :param is_email: Whether the match is a detected email
+        """
+        if is_email:
+            kind = 'matches_email'
+        elif ' ' in item:
+            kind = 'matches_multi_word'
+        else:
+            kind = 'matches_single_word'
+        self.metrics.count(kind)
+    
+    def _save_replacements(self, input_filename, detect_emails, detected_emails, input_files=None):
+        """
+        Save the current mapping to a new replacement file.
+        
+        :param input_filename: Name of the input file (for replacement filename generation)
+        :param detect_emails: Whether email detection was enabled
+        :param detected_emails: List of detected emails
+        :param input_files: List of all input files, for a batch run
+        :return: Path of the replacement file (or of the mapping store)
+        """
+        start = time.perf_counter()
+        if self.mapping_store is not None:
+            # Append only what this run added
+            added = self.mapping_store.commit(detected_emails if detect_emails else [])
+            print(f"Mapping store updated: {added} new mappings appended to {self.mapping_store.path}")
+            self._record_save(start)
+            return self.mapping_store.path
+        
+        # Generate unique replacement file
+        replacement_file = self._generate_replacement_filename(input_filename)
+        
+        # Save replacements
+        replacement_data = {
+            'metadata': {
+                'created': datetime.now().isoformat(),
+                'input_file': input_filename,
+                'identifiers_file': self.identifiers_file,
+                'total_replacements': len(self.word_to_code),
+                'emails_detected': len(detected_emails) if detect_emails else 0,
+                'detected_emails': detected_emails if detect_emails else []
+            },
+            'word_to_code': self.word_to_code,
+            'code_to_word': self.code_to_word,
+            'normalized_to_code': self.normalized_to_code
+        }
+        if input_files is not None:
+            replacement_data['metadata']['input_files'] = input_files
+        
+        with open(replacement_file, 'w', encoding='utf-8') as f:
+            _dump_replacement_data(replacement_data, f)
+        
+        print(f"Replacement mapping saved to: {replacement_file}")
+        self._record_save(start)
+        
+        return replacement_file
+    
+    def _record_save(self, start):
+        """
+        Record the time spent saving the mapping and its size in the metrics.
+        
+        :param start: perf_counter() value when saving started
+        """
+        if self.metrics is not None:
+            self.metrics.add_time('save_mapping', time.perf_counter() - start)
+            self.metrics.set('mapping_codes', len(self.code_to_word))
+            self.metrics.set('mapping_words', len(self.word_to_code))
+    
+    def export_mapping(self, output_file):
+        """
+        Export the mapping store to the JSON layout of a replacement file.
+        
+        :param output_file: Path of the JSON file to write
+        :return: Number of exported mappings
+        """
+        word_to_code = {}
+        code_to_word = {}
+        normalized_to_code = {}
+        for word, code in self.mapping_store.items():
+            word_to_code[word] = code
+            code_to_word.setdefault(code, word)
+            normalized_to_code.setdefault(_normalize(word), code)
+        detected_emails = self.mapping_store.emails()
+        
+        replacement_data = {
+            'metadata': {
+                'created': datetime.now().isoformat(),
+                'input_file': self.mapping_store.path,
+                'identifiers_file': self.identifiers_file,
+                'total_replacements': len(word_to_code),
+                'emails_detected': len(detected_emails),
+                'detected_emails': detected_emails
+            },
+            'word_to_code': word_to_code,
+            'code_to_word': code_to_word,
+            'normalized_to_code': normalized_to_code
+        }
+        
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(replacement_data, f, indent=2, ensure_ascii=False)
+        
+        print(f"Exported {len(word_to_code)} mappings from {self.mapping_store.path} to {output_file}")
+        return len(word_to_code)
+    
+    def anonymize_stream(self, chunks, input_filename="unknown", detect_emails=True):
         """
-        Initialize the anonymizer with identifiers file and replacements directory.
+        Anonymize text given as an iterable of chunks, using bounded memory.
+        Output and replacement mapping are the same as for anonymize().
         
-        :param identifiers_file: Text file containing words to anonymize (one per line)
-        :param replacements_dir: Directory to store replacement files
+        :param chunks: Iterable of text chunks (e.g. reads from a file)
+        :param input_filename: Name of the input file (for replacement filename generation)
+        :param detect_emails: Whether to automatically detect and anonymize emails
+        :return: Generator of anonymized text pieces; once exhausted, the
+                 replacement file path (or None) is in self.last_replacement_file
         """
-        self.identifiers_file = identifiers_file
-        self.replacements_dir = replacements_dir
-        self.word_to_code = {}
-        self.code_to_word = {}
-        self.current_code_index = 1
-        self.identifiers = set()
+        self.last_replacement_file = None
+        found_items = {}
+        detected_emails = {}
         
-        # Create replacements directory if it doesn't exist
-        if not os.path.exists(replacements_dir):
-            os.makedirs(replacements_dir)
+        yield from self._anonymize_chunks(chunks, detect_emails, found_items, detected_emails)
         
-        # Load identifiers from file
-        self._load_identifiers()
+        self.last_replacement_file = self._finish_anonymization(found_items, detected_emails,
+                                                                input_filename, detect_emails)
     
-    def _load_identifiers(self):
+    def _finish_anonymization(self, found_items, detected_emails, input_filename, detect_emails):
         """
-        Load identifiers from the identifiers file.
+        Report the results of a document and save the replacement mapping.
+        
+        :param found_items: Dict of item -> code in order of first appearance
+        :param detected_emails: Dict of detected emails
+        :param input_filename: Name of the input file (for replacement filename generation)
+        :param detect_emails: Whether email detection was enabled
+        :return: Path of the replacement file, or None if nothing was replaced
         """
-        if not os.path.exists(self.identifiers_file):
-            print(f"Warning: Identifiers file '{self.identifiers_file}' not found.")
-            print("Please create this file with one identifier per line.")
-            return
+        # Emails are replaced at their detected positions; adding them to the
+        # identifiers afterwards keeps them anonymized in later documents
+        if detected_emails:
+            print(f"Auto-detected {len(detected_emails)} email addresses:")
+            for email in sorted(detected_emails):
+                print(f"  - {email}")
+                self._add_identifier(email)
+            print("Added emails to identifiers for anonymization.")
+        
+        if not self.identifiers:
+            print("No identifiers loaded. Text will not be anonymized.")
+            return None
+        
+        if not found_items:
+            print("No identifiers found in text. No anonymization needed.")
+            return None
+        
+        print(f"Found {len(found_items)} identifiers to anonymize:")
+        for item in sorted(found_items, key=len, reverse=True):
+            print(f"  - '{item}'")
+        
+        return self._save_replacements(input_filename, detect_emails, list(detected_emails))
+    
+    def anonymize(self, text, input_filename="unknown", detect_emails=True):
+        """
+        Anonymize the given text by replacing identified words and phrases while preserving case.
+        Optionally auto-detect email addresses.
+        
+        :param text: Input text to anonymize
+        :param input_filename: Name of the input file (for replacement filename generation)
+        :param detect_emails: Whether to automatically detect and anonymize emails
+        :return: Tuple of (anonymized_text, replacement_file_path)
+        """
+        anonymized_text = ''.join(self.anonymize_stream([text], input_filename, detect_emails))
+        
+        if self.last_replacement_file is None:
+            return text, None
+        
+        return anonymized_text, self.last_replacement_file
+    
+    def anonymize_records(self, records, input_filename="unknown", fields=None, exact_fields=(),
+                          detect_emails=True):
+        """
+        Anonymize structured records (CSV rows as lists, JSONL objects as dicts)
+        in batches, with the same code space and replacement file as anonymize().
+        
+        Only string values of the selected fields are touched; every cell of
+        a CSV row is one, so only JSONL numbers are left alone. Fields in
+        exact_fields are replaced as a whole when the complete value is an
+        identifier (or an email), using one dictionary lookup per distinct
+        value in a batch instead of running the matcher.
+        
+        :param records: Iterable of lists or dicts (or bare JSONL values)
+        :param input_filename: Name of the input file (for replacement filename generation)
+        :param fields: Keys (list indexes or dict keys) to run the matcher on (default: all)
+        :param exact_fields: Keys whose whole value is looked up as one identifier
+        :param detect_emails: Whether to automatically detect and anonymize emails
+        :return: Generator of anonymized records; once exhausted, the replacement
+                 file path (or None) is in self.last_replacement_file
+        """
+        self.last_replacement_file = None
+        found_items = {}
+        detected_emails = {}
+        exact_fields = set(exact_fields)
+        selected = None if fields is None else set(fields) | exact_fields
+        records = iter(records)
+        
+        while True:
+            batch = list(islice(records, RECORD_BATCH_SIZE))
+            if not batch:
+                break
+            if self.metrics is not None:
+                self.metrics.count('records', len(batch))
+            # A JSON Lines record can also be a bare value, handled as a
+            # record with one unnamed field
+            scalars = [not isinstance(record, (list, dict)) for record in batch]
+            batch = [[record] if scalar else record for record, scalar in zip(batch, scalars)]
+            
+            # Distinct values per kind of field across the whole batch
+            text_values = {}
+            exact_values = {}
+            for record, scalar in zip(batch, scalars):
+                for key in _record_keys(record, selected, scalar):
+                    value = record[key]
+                    if isinstance(value, str):
+                        (exact_values if key in exact_fields else text_values)[value] = None
+            
+            # Exact columns: one normalized lookup per distinct value
+            identifiers = self.identifiers
+            for value, normalized in zip(list(exact_values), map(_normalize, exact_values)):
+                if normalized in identifiers:
+                    exact_values[value] = True
+                elif detect_emails and EMAIL_PATTERN.fullmatch(value):
+                    exact_values[value] = True
+                    detected_emails[value] = None
+            
+            # Free-text fields: run the matcher once per distinct value
+            for value in text_values:
+                matches, emails = self._match_document(value, detect_emails)
+                text_values[value] = matches
+                for email in emails:
+                    detected_emails[email] = None
+            
+            # Assign codes record by record, so they follow the order of appearance
+            for record, scalar in zip(batch, scalars):
+                for key in _record_keys(record, selected, scalar):
+                    value = record[key]
+                    if not isinstance(value, str):
+                        continue
+                    if key in exact_fields:
+                        if exact_values[value]:
+                            record[key] = self._record_code(value, found_items)
+                        continue
+                    matches = text_values[value]
+                    if matches:
+                        parts = []
+                        last_end = 0
+                        for start, end in matches:
+                            parts.append(value[last_end:start])
+                            parts.append(self._record_code(value[start:end], found_items))
+                            last_end = end
+                        parts.append(value[last_end:])
+                        record[key] = ''.join(parts)
+                yield record[0] if scalar else record
+        
+        self.last_replacement_file = self._finish_anonymization(found_items, detected_emails,
+                                                                input_filename, detect_emails)
+    
+    def _record_code(self, item, found_items):
+        """
+        Return the code for an item, recording it as found.
+        
+        :param item: Matched text
+        :param found_items: Dict of item -> code in order of first appearance
+        :return: Code for the item
+        """
+        code = found_items.get(item)
+        if code is None:
+            code = found_items[item] = self._get_code(item)
+        return code
+    
+    def deanonymize_records(self, records, replacement_file=None, fields=None):
+        """
+        Restore the original words in the selected fields of structured records.
+        
+        :param records: Iterable of lists or dicts (or bare JSONL values)
+        :param replacement_file: Path to the replacement JSON file (default: the current mapping)
+        :param fields: Keys to restore (default: all)
+        :return: Generator of restored records
+        """
+        if replacement_file is None:
+            code_to_word, pattern = self._current_code_matcher()
+        else:
+            loaded = self._load_code_matcher(replacement_file)
+            if loaded is None:
+                yield from records
+                return
+            code_to_word, _, pattern = loaded
+        
+        def restore(match):
+            code = match.group()
+            return code_to_word.get(code, code)
+        
+        selected = None if fields is None else set(fields)
+        for record in records:
+            if not isinstance(record, (list, dict)):
+                # A bare JSON Lines value is restored only when all fields are
+                if selected is None and isinstance(record, str):
+                    record = pattern.sub(restore, record)
+                yield record
+                continue
+            for key in _record_keys(record, selected):
+                value = record[key]
+                if isinstance(value, str):
+                    record[key] = pattern.sub(restore, value)
+            yield record
+    
+    def _match_document(self, text, detect_emails=True):
+        """
+        Find all matches in a complete document without changing the anonymizer state.
+        
+        :param text: Input text
+        :param detect_emails: Whether to automatically detect emails
+        :return: Tuple of (list of (start_pos, end_pos) matches, list of detected emails)
+        """
+        email_spans = self._find_email_spans(text) if detect_emails else []
+        detected_emails = list(dict.fromkeys(text[start:end] for start, end in email_spans))
+        return list(self._find_matches(text, 0, email_spans)), detected_emails
+    
+    def anonymize_mapped(self, input_file, output_file, detect_emails=True):
+        """
+        Anonymize a file through a memory map, without decoding it as a whole.
+        
+        The file is processed in segments that end after a newline. ASCII
+        segments are matched directly on the mapped bytes; segments with other
+        characters are decoded and matched as text, with the match positions
+        converted back to byte offsets. Unchanged byte ranges go from the map
+        to the output in bulk writes and only the codes are new data, so line
+        endings are kept as they are. Otherwise the output is the same as
+        anonymize() of the decoded text.
+        
+        :param input_file: Input file path
+        :param output_file: Output file path
+        :param detect_emails: Whether to automatically detect and anonymize emails
+        :return: Path of the replacement file, or None if nothing was replaced
+        """
+        metrics = self.metrics
+        found_items = {}
+        detected_emails = {}
+        # Encoded codes, so repeated items are not encoded again
+        encoded_codes = {}
+        
+        with open(input_file, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        view = memoryview(mapped) if mapped is not None else None
         
         try:
-            with open(self.identifiers_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    identifier = line.strip()
-                    if identifier and not identifier.startswith('#'):  # Skip empty lines and comments
-                        self.identifiers.add(identifier.lower())
-            print(f"Loaded {len(self.identifiers)} identifiers from {self.identifiers_file}")
+            with open(output_file, 'wb', buffering=0) as out:
+                for segment_start, segment_end in _split_segments(mapped, size, STREAM_CHUNK_SIZE):
+                    if metrics is not None:
+                        stage_start = time.perf_counter()
+                    
+                    if NON_ASCII_PATTERN.search(mapped, segment_start, segment_end) is None:
+                        # Match on the mapped bytes; positions are byte offsets
+                        email_spans = []
+                        if detect_emails:
+                            email_spans = self._find_email_spans(mapped, segment_start, segment_end)
+                            for start, end in email_spans:
+                                detected_emails[mapped[start:end].decode('ascii')] = None
+                        spans = [(start, end, mapped[start:end].decode('ascii'))
+                                 for start, end in self._find_matches(mapped, segment_start, email_spans,
+                                                                      segment_end)]
+                    else:
+                        with view[segment_start:segment_end] as data:
+                            text = str(data, 'utf-8')
+                        matches, emails = self._match_document(text, detect_emails)
+                        for email in emails:
+                            detected_emails[email] = None
+                        
+                        # Convert character positions to byte offsets
+                        spans = []
+                        offset = segment_start
+                        last_end = 0
+                        for start, end in matches:
+                            offset += len(text[last_end:start].encode('utf-8'))
+                            item = text[start:end]
+                            item_end = offset + len(item.encode('utf-8'))
+                            spans.append((offset, item_end, item))
+                            offset = item_end
+                            last_end = end
+                    
+                    if metrics is not None:
+                        now = time.perf_counter()
+                        metrics.add_time('matching', now - stage_start)
+                        stage_start = now
+                    
+                    buffers = []
+                    last_end = segment_start
+                    for start, end, item in spans:
+                        code = found_items.get(item)
+                        if code is None:
+                            # Codes are numbered in order of first appearance
+                            code = found_items[item] = self._get_code(item)
+                        data = encoded_codes.get(code)
+                        if data is None:
+                            data = encoded_codes[code] = code.encode('utf-8')
+                        if start > last_end:
+                            buffers.append(view[last_end:start])
+                        buffers.append(data)
+                        last_end = end
+                    if segment_end > last_end:
+                        buffers.append(view[last_end:segment_end])
+                    _write_buffers(out, buffers)
+                    
+                    if metrics is not None:
+                        metrics.add_time('rewrite', time.perf_counter() - stage_start)
+                        metrics.count('chunks')
+                        metrics.count('bytes_in', segment_end - segment_start)
+                        metrics.count('bytes_out', sum(map(len, buffers)))
+                        for _, _, item in spans:
+                            self._count_item(item, item in detected_emails)
+        finally:
+            # Slices of the map must be gone before it can be closed
+            buffers = None
+            if view is not None:
+                view.release()
+                mapped.close()
+        
+        return self._finish_anonymization(found_items, detected_emails, input_file, detect_emails)
+    
+    def anonymize_parallel(self, input_file, output_file, workers=None, detect_emails=True):
+        """
+        Anonymize one large file by matching segments of it in a process pool.
+        
+        The file is split after newlines, which no identifier or email can
+        contain, so every segment has the same matches as in a single pass.
+        Workers map the file themselves and only return match positions;
+        codes are assigned in the parent in segment order, so the output and
+        the code numbering are the same as for a single-process run.
+        
+        :param input_file: Input file path
+        :param output_file: Output file path
+        :param workers: Number of worker processes (default: number of CPUs)
+        :param detect_emails: Whether to automatically detect and anonymize emails
+        :return: Path of the replacement file, or None if nothing was replaced
+        """
+        workers = workers or os.cpu_count() or 1
+        found_items = {}
+        detected_emails = {}
+        start_time = time.perf_counter()
+        
+        with open(input_file, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        
+        try:
+            segments = _split_segments(mapped, size, min(PARALLEL_SEGMENT_SIZE, -(-size // workers)))
+            print(f"Anonymizing {input_file} in {len(segments)} segments with {workers} workers...")
+            
+            # Build the matcher before forking so workers inherit it
+            self._get_matcher()
+            if workers > 1 and len(segments) > 1:
+                executor = ProcessPoolExecutor(max_workers=workers, initializer=_batch_worker_init,
+                                               initargs=(self,))
+            else:
+                executor = None
+                _batch_worker_init(self)
+            
+            # Keep a bounded number of segments in flight, so match lists of a
+            # huge file do not pile up while the parent writes
+            pending = deque()
+            segments = iter(segments)
+            
+            with open(output_file, 'w', encoding='utf-8') as out:
+                while True:
+                    while executor is not None and len(pending) < workers * 2:
+                        segment = next(segments, None)
+                        if segment is None:
+                            break
+                        pending.append(executor.submit(_parallel_match_segment, input_file, *segment,
+                                                       detect_emails))
+                    if executor is not None:
+                        if not pending:
+                            break
+                        segment_start, segment_end, matches, emails, elapsed = pending.popleft().result()
+                    else:
+                        segment = next(segments, None)
+                        if segment is None:
+                            break
+                        segment_start, segment_end, matches, emails, elapsed = _parallel_match_segment(
+                            input_file, *segment, detect_emails, mapped)
+                    
+                    rewrite_start = time.perf_counter()
+                    text = _decode_segment(mapped, segment_start, segment_end)
+                    
+                    parts = []
+                    last_end = 0
+                    for start, end in matches:
+                        item = text[start:end]
+                        code = found_items.get(item)
+                        if code is None:
+                            # Codes are numbered in order of first appearance
+                            code = found_items[item] = self._get_code(item)
+                        parts.append(text[last_end:start])
+                        parts.append(code)
+                        last_end = end
+                    parts.append(text[last_end:])
+                    out.write(''.join(parts))
+                    
+                    for email in emails:
+                        detected_emails[email] = None
+                    
+                    if self.metrics is not None:
+                        # Matching time is summed over the worker processes
+                        self.metrics.add_time('matching', elapsed)
+                        self.metrics.add_time('rewrite', time.perf_counter() - rewrite_start)
+                        self.metrics.count('chunks')
+                        self.metrics.count('bytes_in', segment_end - segment_start)
+                        self._count_matches(text, matches, emails=emails)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            if mapped is not None:
+                mapped.close()
+        
+        total_time = time.perf_counter() - start_time
+        print(f"Processed {size / (1024 * 1024):.2f} MB in {total_time:.2f}s: "
+              f"{size / (1024 * 1024) / total_time if total_time else 0.0:.2f} MB/s")
+        
+        return self._finish_anonymization(found_items, detected_emails, input_file, detect_emails)
+    
+    def anonymize_batch(self, input_files, workers=None, detect_emails=True, output_dir=None, output_files=None):
+        """
+        Anonymize many files in parallel with one shared code space.
+        
+        Matching runs in a process pool; codes are assigned in the parent in
+        input order, so every file gets the same codes as a sequential run and
+        one replacement file covers the whole batch. Emails detected in a file
+        become identifiers for the files after it, as in a sequential run; a
+        file in which such an email occurs outside its matches is matched
+        again in the parent.
+        
+        :param input_files: List of input file paths
+        :param workers: Number of worker processes (default: number of CPUs)
+        :param detect_emails: Whether to automatically detect and anonymize emails
+        :param output_dir: Directory for the output files (default: next to each input)
+        :param output_files: Dict of input path -> output path to use instead of a generated name
+        :return: Tuple of (list of per-file result dicts, replacement_file_path)
+        """
+        workers = workers or os.cpu_count() or 1
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in input_files])
+        found_items = {}
+        detected_emails = {}
+        # Emails that became identifiers during this batch, in a matcher of
+        # their own that finds them in one pass however many there are
+        carried = IdentifierMatcher(set())
+        results = []
+        batch_start = time.perf_counter()
+        
+        print(f"Anonymizing {len(input_files)} files with {workers} workers...")
+        
+        # Build the matcher before forking so workers inherit it
+        self._get_matcher()
+        if workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_batch_worker_init,
+                                           initargs=(self,))
+            chunksize = max(1, len(input_files) // (workers * 4))
+            matched = executor.map(_batch_match_file, input_files, [detect_emails] * len(input_files),
+                                   chunksize=chunksize)
+        else:
+            executor = None
+            _batch_worker_init(self)
+            matched = map(_batch_match_file, input_files, [detect_emails] * len(input_files))
+        
+        try:
+            for path, matches, emails, size, elapsed, error in matched:
+                if error:
+                    print(f"Error processing '{path}': {error}")
+                    continue
+                
+                rewrite_start = time.perf_counter()
+                with open(path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+                if carried.size and _outside_matches(carried.finditer(text), matches):
+                    matches, emails = self._match_document(text, detect_emails)
+                
+                parts = []
+                last_end = 0
+                for start, end in matches:
+                    item = text[start:end]
+                    code = found_items.get(item)
+                    if code is None:
+                        code = found_items[item] = self._get_code(item)
+                    parts.append(text[last_end:start])
+                    parts.append(code)
+                    last_end = end
+                parts.append(text[last_end:])
+                
+                for email in emails:
+                    if email not in detected_emails:
+                        detected_emails[email] = None
+                        if _normalize(email) not in self.identifiers:
+                            self._add_identifier(email)
+                            carried.add(_normalize(email))
+                
+                output_file = (output_files or {}).get(path)
+                if output_file is None:
+                    output_file = self._generate_output_filename(path, "anonymized")
+                    if output_dir:
+                        output_file = os.path.join(output_dir, os.path.relpath(os.path.abspath(output_file), root))
+                        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    f.write(''.join(parts))
+                
+                if self.metrics is not None:
+                    # Matching time is summed over the worker processes
+                    self.metrics.add_time('matching', elapsed)
+                    self.metrics.add_time('rewrite', time.perf_counter() - rewrite_start)
+                    self.metrics.count('bytes_in', size)
+                    self._count_matches(text, matches, emails=emails)
+                
+                results.append({
+                    'input_file': path,
+                    'output_file': output_file,
+                    'bytes': size,
+                    'matches': len(matches),
+                    'items': sorted(set(_normalize(text[start:end]) for start, end in matches)),
+                    'seconds': elapsed
+                })
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        
+        total_time = time.perf_counter() - batch_start
+        total_bytes = sum(result['bytes'] for result in results)
+        
+        print(f"{'File':<50} {'Size (KB)':>10} {'Matches':>8} {'MB/s':>8}")
+        for result in results:
+            rate = result['bytes'] / (1024 * 1024) / result['seconds'] if result['seconds'] else 0.0
+            print(f"{result['input_file']:<50} {result['bytes'] / 1024:>10.1f} {result['matches']:>8} {rate:>8.2f}")
+        print(f"Processed {len(results)} files ({total_bytes / (1024 * 1024):.2f} MB) in {total_time:.2f}s: "
+              f"{total_bytes / (1024 * 1024) / total_time if total_time else 0.0:.2f} MB/s, "
+              f"{len(results) / total_time if total_time else 0.0:.1f} files/s")
+        
+        if not found_items:
+            print("No identifiers found in any file. No replacement file written.")
+            return results, None
+        
+        print(f"Found {len(found_items)} distinct identifiers across all files.")
+        replacement_file = self._save_replacements("batch", detect_emails, list(detected_emails),
+                                                   input_files=[result['input_file'] for result in results])
+        return results, replacement_file
+    
+    def anonymize_incremental(self, input_files, workers=None, detect_emails=True, output_dir=None):
+        """
+        Anonymize only the files that changed since the previous run, or that
+        are affected by a change of the identifiers file, continuing the same
+        code space so unchanged outputs stay valid.
+        
+        A manifest in the replacements directory records, per input file, its
+        size, mtime and SHA-256, the identifiers it contained and the output
+        and replacement file produced. A snapshot of the identifiers is kept
+        next to it to work out which identifiers were added or removed.
+        
+        :param input_files: List of input file paths
+        :param workers: Number of worker processes (default: number of CPUs)
+        :param detect_emails: Whether to automatically detect and anonymize emails
+        :param output_dir: Directory for the output files (default: next to each input)
+        :return: Tuple of (list of per-file result dicts, replacement_file_path)
+        """
+        manifest_file = os.path.join(self.replacements_dir, MANIFEST_FILE)
+        snapshot_file = os.path.join(self.replacements_dir, MANIFEST_IDENTIFIERS_FILE)
+        manifest = {'files': {}}
+        if os.path.exists(manifest_file):
+            try:
+                with open(manifest_file, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not read manifest '{manifest_file}', processing all files: {e}")
+        records = manifest['files']
+        
+        # Continue the code space of the previous run
+        previous_mapping = manifest.get('replacement_file')
+        mapping_missing = False
+        if self.mapping_store is None and previous_mapping and os.path.exists(previous_mapping):
+            self.load_replacements(previous_mapping)
+        elif self.mapping_store is None and previous_mapping:
+            # Numbering would restart at X01 and clash with the codes in the
+            # unchanged outputs, so every file gets new codes instead (without
+            # a previous mapping no codes were issued, so nothing can clash)
+            print(f"Warning: Replacement file '{previous_mapping}' of the previous run not found, "
+                  f"processing all files.")
+            mapping_missing = True
+        
+        # Work out which identifiers changed since the previous run
+        identifiers_digest = _file_digest(self.identifiers_file) if os.path.exists(self.identifiers_file) else None
+        added = removed = set()
+        current = None
+        if identifiers_digest != manifest.get('identifiers_sha256') or not os.path.exists(snapshot_file):
+            # Taken before processing, which adds detected emails to the identifiers
+            current = set(self.identifiers)
+        if identifiers_digest != manifest.get('identifiers_sha256') and records:
+            previous = set()
+            if os.path.exists(snapshot_file):
+                with open(snapshot_file, 'r', encoding='utf-8') as f:
+                    previous = set(f.read().split('\n')) - {''}
+            added = current - previous
+            removed = previous - current
+            print(f"Identifiers changed: {len(added)} added, {len(removed)} removed.")
+        added_matcher = IdentifierMatcher(added) if added else None
+        
+        changed = []
+        for path in input_files:
+            key = os.path.abspath(path)
+            record = records.get(key)
+            stat = os.stat(path)
+            reason = None
+            if record is None:
+                reason = 'new'
+            elif mapping_missing:
+                reason = 'mapping missing'
+            elif not os.path.exists(record['output_file']):
+                reason = 'output missing'
+            elif (record['size'], record['mtime_ns']) != (stat.st_size, stat.st_mtime_ns):
+                # Only hash the content when the timestamp or size changed
+                if _file_digest(path) != record['sha256']:
+                    reason = 'changed'
+                else:
+                    record['size'], record['mtime_ns'] = stat.st_size, stat.st_mtime_ns
+            if reason is None and removed and removed.intersection(record['items']):
+                reason = 'identifier removed'
+            if reason is None and added_matcher is not None:
+                with open(path, 'r', encoding='utf-8') as f:
+                    if next(added_matcher.finditer(f.read()), None) is not None:
+                        reason = 'identifier added'
+            if reason is not None:
+                changed.append(path)
+                print(f"  {reason}: {path}")
+        
+        print(f"{len(changed)} of {len(input_files)} files need processing.")
+        results, replacement_file = [], None
+        if changed:
+            # Re-processed files keep their output path
+            output_files = {path: records[os.path.abspath(path)]['output_file'] for path in changed
+                            if os.path.abspath(path) in records}
+            results, replacement_file = self.anonymize_batch(changed, workers, detect_emails, output_dir,
+                                                             output_files)
+        
+        # Record what this run produced
+        replacement_file = replacement_file or previous_mapping
+        for result in results:
+            stat = os.stat(result['input_file'])
+            records[os.path.abspath(result['input_file'])] = {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': _file_digest(result['input_file']),
+                'identifiers_sha256': identifiers_digest,
+                'items': result['items'],
+                'output_file': result['output_file'],
+                'replacement_file': replacement_file,
+            }
+        for key in [key for key in records if not os.path.exists(key)]:
+            del records[key]
+        
+        manifest = {
+            'updated': datetime.now().isoformat(),
+            'identifiers_file': self.identifiers_file,
+            'identifiers_sha256': identifiers_digest,
+            'replacement_file': replacement_file,
+            'files': records,
+        }
+        _write_atomic(manifest_file, json.dumps(manifest, indent=2, ensure_ascii=False))
+        if current is not None:
+            _write_atomic(snapshot_file, ''.join(identifier + '\n' for identifier in sorted(current)))
+        print(f"Manifest updated: {manifest_file}")
+        return results, replacement_file
+    
+    def _load_code_matcher(self, replacement_file):
+        """
+        Load the mapping of a replacement file and compile a matcher for its codes.
+        Results are kept in an LRU cache of mapping_cache_size files, and are
+        reloaded when a file changes on disk.
+        
+        :param replacement_file: Path to the replacement JSON file
+        :return: Tuple of (code_to_word, metadata, compiled pattern), or None on error
+        """
+        if not os.path.exists(replacement_file):
+            print(f"Error: Replacement file '{replacement_file}' not found.")
+            return None
+        
+        path = os.path.abspath(replacement_file)
+        stat = os.stat(path)
+        stats = self.mapping_cache_stats
+        # Reinserting moves the entry to the most recently used end
+        cached = self._code_matchers.pop(path, None)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            self._code_matchers[path] = cached
+            stats['hits'] += 1
+            if self.metrics is not None:
+                self.metrics.count('mapping_cache_hits')
+            return cached[2:]
+        stats['misses'] += 1
+        if self.metrics is not None:
+            self.metrics.count('mapping_cache_misses')
+        
+        try:
+            with open(replacement_file, 'r', encoding='utf-8') as f:
+                replacement_data = json.load(f)
         except Exception as e:
-            print(f"Error loading identifiers file: {e}")
-            sys.exit(1)
+            print(f"Error reading replacement file: {e}")
+            return None
+        
+        # Valid JSON can still have the wrong shape, e.g. a hand-edited file
+        code_to_word = replacement_data.get('code_to_word', {}) if isinstance(replacement_data, dict) else None
+        metadata = replacement_data.get('metadata', {}) if isinstance(replacement_data, dict) else None
+        if (not isinstance(code_to_word, dict) or not isinstance(metadata, dict)
+                or not all(isinstance(word, str) for word in code_to_word.values())):
+            print(f"Error reading replacement file: '{replacement_file}' is not a replacement file "
+                  f"(expected an object with a code_to_word object of strings)")
+            return None
+        
+        # Keep a large cached mapping compact when it only holds generated codes
+        mapping = None
+        if self.code_map_min_entries is not None and len(code_to_word) >= self.code_map_min_entries:
+            mapping = CodeMap.from_dicts({}, code_to_word)
+        if mapping is not None:
+            code_to_word = mapping.views()[1]
+            pattern = CODE_PATTERN
+        else:
+            pattern = _compile_code_pattern(code_to_word)
+        
+        self._code_matchers[path] = (stat.st_mtime_ns, stat.st_size, code_to_word, metadata, pattern)
+        while len(self._code_matchers) > max(self.mapping_cache_size, 1):
+            del self._code_matchers[next(iter(self._code_matchers))]
+            stats['evictions'] += 1
+        return code_to_word, metadata, pattern
+    
+    def _restore_chunks(self, chunks, code_to_word, pattern):
+        """
+        Replace every code in a stream of text chunks in a single scan.
+        
+        :param chunks: Iterable of text chunks
+        :param code_to_word: Mapping of codes to original words
+        :param pattern: Compiled pattern that finds the codes
+        :return: Generator of restored text pieces
+        """
+        def restore(match):
+            code = match.group()
+            return code_to_word.get(code, code)
+        
+        metrics = self.metrics
+        if metrics is not None:
+            substitute = lambda text: self._profile_restore(pattern, restore, text)
+        else:
+            substitute = lambda text: pattern.sub(restore, text)
+        
+        buffer = ''
+        for chunk in chunks:
+            buffer += chunk
+            # Only flush up to the last non-word character, so no code is split
+            cut = len(buffer)
+            while cut > 0 and _is_word_char(buffer[cut - 1]):
+                cut -= 1
+            if cut > 0:
+                yield substitute(buffer[:cut])
+                buffer = buffer[cut:]
+        yield substitute(buffer)
+    
+    def _profile_restore(self, pattern, restore, text):
+        """
+        Restore codes in a piece of text while recording time and counters.
+        
+        :param pattern: Compiled pattern that finds the codes
+        :param restore: Replacement function for a code match
+        :param text: Anonymized text
+        :return: Restored text
+        """
+        start = time.perf_counter()
+        restored, codes = pattern.subn(restore, text)
+        self.metrics.add_time('restore', time.perf_counter() - start)
+        self.metrics.count('bytes_in', len(text.encode('utf-8')))
+        self.metrics.count('bytes_out', len(restored.encode('utf-8')))
+        self.metrics.count('codes_found', codes)
+        return restored
+    
+    def _current_code_matcher(self):
+        """
+        Return the in-memory (or mapping store) mapping and a pattern for its codes.
+        
+        :return: Tuple of (code_to_word, compiled pattern)
+        """
+        if self.mapping_store is not None or self._code_map is not None:
+            # Stores and CodeMaps only hold generated codes; never enumerate them
+            return self.code_to_word, CODE_PATTERN
+        return self.code_to_word, _compile_code_pattern(self.code_to_word)
+    
+    def deanonymize_stream(self, chunks, replacement_file=None):
+        """
+        Restore the original words from a stream of anonymized text chunks.
+        
+        :param chunks: Iterable of text chunks
+        :param replacement_file: Path to the replacement JSON file (default: the current mapping,
+                                 e.g. the mapping store)
+        :return: Generator of restored text pieces
+        """
+        start = time.perf_counter()
+        if replacement_file is None:
+            code_to_word, pattern = self._current_code_matcher()
+            loaded = code_to_word, {}, pattern
+        else:
+            loaded = self._load_code_matcher(replacement_file)
+        if self.metrics is not None:
+            self.metrics.add_time('load_mapping', time.perf_counter() - start)
+        if loaded is None:
+            yield from chunks
+            return
+        
+        code_to_word, metadata, pattern = loaded
+        if not code_to_word:
+            print("No replacement mappings found in file.")
+            yield from chunks
+            return
+        
+        # Show some metadata if available
+        if 'emails_detected' in metadata:
+            print(f"This replacement file contained {metadata['emails_detected']} auto-detected emails.")
+        
+        yield from self._restore_chunks(chunks, code_to_word, pattern)
+        
+        print(f"Deanonymization completed using {len(code_to_word)} mappings.")
+    
+    def deanonymize(self, text, replacement_file=None):
+        """
+        Restore the original words from anonymized text using a specific replacement file.
+        
+        :param text: Anonymized text
+        :param replacement_file: Path to the replacement JSON file (default: the current mapping)
+        :return: Original text
+        """
+        return ''.join(self.deanonymize_stream([text], replacement_file))
+    
+    def deanonymize_batch(self, pairs, workers=None, output_dir=None):
+        """
+        Deanonymize many files, each against its own replacement file, in a process pool.
+        
+        Files that share a replacement file are handed out next to each other,
+        so a worker parses a mapping once and then serves it from its LRU
+        cache (see _load_code_matcher) for the following files.
+        
+        :param pairs: List of (input_file, replacement_file) tuples
+        :param workers: Number of worker processes (default: number of CPUs)
+        :param output_dir: Directory for the output files (default: next to each input)
+        :return: List of per-file result dicts
+        """
+        workers = workers or os.cpu_count() or 1
+        # Stable sort: input order is kept within each replacement file
+        pairs = sorted(pairs, key=lambda pair: os.path.abspath(pair[1]))
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path, _ in pairs])
+        output_files = []
+        for path, _ in pairs:
+            output_file = self._generate_output_filename(path, "deanonymized")
+            if output_dir:
+                output_file = os.path.join(output_dir, os.path.relpath(os.path.abspath(output_file), root))
+                os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            output_files.append(output_file)
+        
+        mappings = len(set(os.path.abspath(replacement_file) for _, replacement_file in pairs))
+        print(f"Deanonymizing {len(pairs)} files against {mappings} replacement files with {workers} workers...")
+        batch_start = time.perf_counter()
+        
+        arguments = ([path for path, _ in pairs], [replacement_file for _, replacement_file in pairs], output_files)
+        if workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_batch_worker_init,
+                                           initargs=(self,))
+            chunksize = max(1, len(pairs) // (workers * 4))
+            restored = executor.map(_batch_restore_file, *arguments, chunksize=chunksize)
+        else:
+            executor = None
+            _batch_worker_init(self)
+            restored = map(_batch_restore_file, *arguments)
+        
+        results = []
+        cache = {'hits': 0, 'misses': 0, 'evictions': 0}
+        try:
+            for path, replacement_file, output_file, size, elapsed, counts, error in restored:
+                for key, count in counts.items():
+                    cache[key] += count
+                if error:
+                    print(f"Error processing '{path}': {error}")
+                    continue
+                if self.metrics is not None and executor is not None:
+                    # Worker processes profile into their own copies; restore
+                    # time is summed over them
+                    self.metrics.add_time('restore', elapsed)
+                    self.metrics.count('bytes_in', size)
+                results.append({
+                    'input_file': path,
+                    'replacement_file': replacement_file,
+                    'output_file': output_file,
+                    'bytes': size,
+                    'seconds': elapsed
+                })
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        
+        if self.metrics is not None and executor is not None:
+            self.metrics.count('mapping_cache_hits', cache['hits'])
+            self.metrics.count('mapping_cache_misses', cache['misses'])
+        
+        total_time = time.perf_counter() - batch_start
+        total_bytes = sum(result['bytes'] for result in results)
+        lookups = cache['hits'] + cache['misses']
+        print(f"Processed {len(results)} of {len(pairs)} files ({total_bytes / (1024 * 1024):.2f} MB) "
+              f"in {total_time:.2f}s: {len(results) / total_time if total_time else 0.0:.1f} files/s, "
+              f"{total_bytes / (1024 * 1024) / total_time if total_time else 0.0:.2f} MB/s")
+        print(f"Mapping cache: {cache['hits']} hits, {cache['misses']} misses "
+              f"({cache['hits'] / lookups if lookups else 0.0:.1%} hit rate), {cache['evictions']} evictions")
+        return results
+
+
+def _compile_code_pattern(codes):
+    """
+    Compile a pattern that finds the given codes in text.
+    
+    :param codes: Iterable of codes
+    :return: Compiled pattern
+    """
+    codes = list(codes)
+    if all(CODE_PATTERN.fullmatch(code) for code in codes):
+        # All codes have the generated shape: one tokenizer finds them all
+        return CODE_PATTERN
+    # Custom codes: alternation with the longest codes first
+    codes.sort(key=len, reverse=True)
+    return re.compile(r'\b(?:' + '|'.join(re.escape(code) for code in codes) + r')\b')
+
+
+def _dump_replacement_data(replacement_data, f):
+    """
+    Write replacement data exactly like json.dump(indent=2, ensure_ascii=False),
+    encoding CodeMapViews in slices instead of copying them into dicts first.
+
+    :param replacement_data: Dict of sections (metadata and mappings)
+    :param f: Text file to write to
+    """
+    f.write('{')
+    separator = '\n'
+    for key, value in replacement_data.items():
+        f.write(f'{separator}  {json.dumps(key, ensure_ascii=False)}: ')
+        separator = ',\n'
+        if not isinstance(value, CodeMapView):
+            f.write(json.dumps(value, indent=2, ensure_ascii=False).replace('\n', '\n  '))
+            continue
+        if not value:
+            f.write('{}')
+            continue
+        items = iter(value.items())
+        f.write('{')
+        entry_separator = '\n'
+        while True:
+            chunk = dict(islice(items, RECORD_BATCH_SIZE))
+            if not chunk:
+                break
+            # The entries are flat strings, so the separator gives the same layout
+            # as indent=2 one level deep, through the faster C encoder
+            entries = json.dumps(chunk, ensure_ascii=False, separators=(',\n    ', ': '))[1:-1]
+            f.write(entry_separator + '    ' + entries)
+            entry_separator = ',\n'
+        f.write('\n  }')
+    f.write('\n}' if separator != '\n' else '}')
+
+
+# Anonymizer inherited by (or sent to) each batch worker process
+_batch_anonymizer = None
+
+
+def _outside_matches(occurrences, matches):
+    """
+    Check whether any occurrence lies outside the matches of a text, i.e.
+    whether matching the text again could give other results.
+    
+    :param occurrences: Iterable of (start_pos, end_pos) spans
+    :param matches: Sorted list of (start_pos, end_pos) matches in the text
+    :return: True if the text needs to be matched again
+    """
+    starts = [start for start, _ in matches]
+    for start, end in occurrences:
+        index = bisect_right(starts, start) - 1
+        if index < 0 or matches[index][1] < end:
+            return True
+    return False
+
+
+def _batch_worker_init(anonymizer):
+    """
+    Set up a batch worker process.
+    
+    :param anonymizer: TextAnonymizer with identifiers already loaded
+    """
+    global _batch_anonymizer
+    _batch_anonymizer = anonymizer
+
+
+def _batch_match_file(path, detect_emails):
+    """
+    Find the matches in one input file (runs in a worker process).
+    
+    :param path: Input file path
+    :param detect_emails: Whether to automatically detect emails
+    :return: Tuple of (path, matches, detected_emails, size_in_bytes, seconds, error)
+    """
+    start = time.perf_counter()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        matches, emails = _batch_anonymizer._match_document(text, detect_emails)
+    except Exception as e:
+        return path, [], [], 0, 0.0, str(e)
+    return path, matches, emails, len(text.encode('utf-8')), time.perf_counter() - start, None
+
+
+def _batch_restore_file(path, replacement_file, output_file):
+    """
+    Deanonymize one file with its replacement file (runs in a worker process).
+    
+    :param path: Anonymized input file path
+    :param replacement_file: Path to the replacement JSON file
+    :param output_file: Output file path
+    :return: Tuple of (path, replacement_file, output_file, size_in_bytes, seconds,
+             mapping cache counts for this file, error)
+    """
+    start = time.perf_counter()
+    stats = _batch_anonymizer.mapping_cache_stats
+    before = dict(stats)
+    size = 0
+    error = None
+    try:
+        loaded = _batch_anonymizer._load_code_matcher(replacement_file)
+        if loaded is None:
+            error = f"cannot load replacement file '{replacement_file}'"
+        else:
+            code_to_word, _, pattern = loaded
+            with open(path, 'r', encoding='utf-8') as f, open(output_file, 'w', encoding='utf-8') as out:
+                chunks = iter(lambda: f.read(STREAM_CHUNK_SIZE), '')
+                for piece in _batch_anonymizer._restore_chunks(chunks, code_to_word, pattern):
+                    out.write(piece)
+            size = os.path.getsize(path)
+    except Exception as e:
+        error = str(e)
+    counts = {key: stats[key] - before[key] for key in stats}
+    return path, replacement_file, output_file, size, time.perf_counter() - start, counts, error
+
+
+def _split_segments(mapped, size, segment_size):
+    """
+    Split a file into segments that each end after a newline.
+    
+    :param mapped: mmap of the file, or None for an empty file
+    :param size: File size in bytes
+    :param segment_size: Target segment size in bytes
+    :return: List of (start, end) byte offsets
+    """
+    segments = []
+    start = 0
+    while start < size:
+        newline = mapped.find(b'\n', start + max(segment_size, 1) - 1)
+        end = size if newline == -1 else newline + 1
+        segments.append((start, end))
+        start = end
+    return segments
+
+
+def _decode_segment(mapped, start, end):
+    """
+    Decode a segment of a mapped file the way open() in text mode reads it,
+    without copying the bytes first.
+    
+    :param mapped: mmap of the file
+    :param start: Start byte offset of the segment
+    :param end: End byte offset of the segment (not inside a '\r\n' pair)
+    :return: Text with universal newlines
+    """
+    with memoryview(mapped) as view, view[start:end] as data:
+        text = str(data, 'utf-8')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+def _write_buffers(f, buffers):
+    """
+    Write buffers to an unbuffered binary file with as few system calls as possible.
+    
+    :param f: File opened with buffering=0
+    :param buffers: List of bytes-like objects
+    """
+    if not hasattr(os, 'writev'):
+        f.writelines(buffers)
+        return
+    
+    fd = f.fileno()
+    for index in range(0, len(buffers), WRITEV_MAX_BUFFERS):
+        batch = buffers[index:index + WRITEV_MAX_BUFFERS]
+        written = os.writev(fd, batch)
+        if written < sum(map(len, batch)):
+            # Short write: write the rest in plain calls
+            rest = memoryview(b''.join(batch))[written:]
+            while rest:
+                rest = rest[os.write(fd, rest):]
+
+
+def _parallel_match_segment(path, start, end, detect_emails, mapped=None):
+    """
+    Find the matches in one segment of a file (runs in a worker process).
+    
+    :param path: Input file path
+    :param start: Start byte offset of the segment
+    :param end: End byte offset of the segment
+    :param detect_emails: Whether to automatically detect emails
+    :param mapped: mmap of the file, if already open
+    :return: Tuple of (start, end, matches relative to the decoded segment,
+             detected_emails, seconds)
+    """
+    begin = time.perf_counter()
+    if mapped is None:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            text = _decode_segment(mapped, start, end)
+    else:
+        text = _decode_segment(mapped, start, end)
+    matches, emails = _batch_anonymizer._match_document(text, detect_emails)
+    return start, end, matches, emails, time.perf_counter() - begin
+
+
+def _file_digest(path):
+    """
+    Compute the SHA-256 of a file's content.
+    
+    :param path: File path
+    :return: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(STREAM_CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_atomic(path, content):
+    """
+    Write a text file through a temporary file, so readers never see a partial file.
+    
+    :param path: File path
+    :param content: Text to write
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+
+def _record_keys(record, selected=None, scalar=False):
+    """
+    Return the keys of a record to process.
+    
+    :param record: List (CSV row) or dict (JSONL object)
+    :param selected: Set of keys to keep, or None for all
+    :param scalar: Whether the record is a bare JSONL value wrapped in a list,
+                   whose one unnamed field is only processed when all fields are
+    :return: List of keys present in the record, in record order
+    """
+    if scalar:
+        return [0] if selected is None else []
+    keys = range(len(record)) if isinstance(record, list) else list(record)
+    if selected is None:
+        return keys
+    return [key for key in keys if key in selected]
+
+
+def _expand_batch_inputs(pattern):
+    """
+    Expand a directory or glob pattern to a sorted list of input files,
+    leaving out the outputs of earlier runs.
     
-    def _find_email_addresses(self, text):
+    :param pattern: Directory path or glob pattern (** is recursive)
+    :return: Sorted list of file paths
+    """
+    if os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+    else:
+        paths = glob.glob(pattern, recursive=True)
+    return sorted(path for path in paths
+                  if os.path.isfile(path) and not GENERATED_OUTPUT_PATTERN.search(os.path.basename(path)))
+
+
+def _read_restore_pairs(path):
+    """
+    Read the (input file, replacement file) pairs of a bulk deanonymization.
+    
+    :param path: Manifest written by --incremental (JSON), whose anonymized output
+                 files are paired with their replacement files, or a text file with
+                 'input_file<TAB>replacement_file' per line ('#' starts a comment)
+    :return: List of (input_file, replacement_file) tuples
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    
+    if content.lstrip().startswith('{'):
+        manifest = json.loads(content)
+        return [(record['output_file'], record['replacement_file'])
+                for record in manifest.get('files', {}).values()
+                if record.get('output_file') and record.get('replacement_file')]
+    
+    pairs = []
+    for number, line in enumerate(content.splitlines(), 1):
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        fields = line.split('\t')
+        if len(fields) != 2 or not all(field.strip() for field in fields):
+            raise ValueError(f"line {number}: expected 'input_file<TAB>replacement_file'")
+        pairs.append((fields[0].strip(), fields[1].strip()))
+    return pairs
+
+
+class PseudonymizationServer:
+    """
+    Local HTTP service around one warm TextAnonymizer.
+    
+    Identifiers, matcher and mapping stay in memory between requests, so every
+    client shares one code space. Connections are handled by asyncio; the
+    anonymizer itself runs on a single worker thread, which keeps its state
+    consistent while the event loop keeps accepting and reading requests.
+    
+    Endpoints (JSON in, JSON out):
+      POST /anonymize    {"text": ...} or {"texts": [...]}, optional "detect_emails"
+      POST /deanonymize  {"text": ...} or {"texts": [...]}, optional "replacement_file"
+                         (inside the replacements directory)
+      POST /save         write the current mapping to a replacement file
+      GET  /stats        request counters and latency percentiles
+    """
+    
+    def __init__(self, anonymizer, detect_emails=True):
         """
-        Find email addresses in the text using comprehensive pattern.
+        Initialize the server.
         
-        :param text: Input text
-        :return: List of email addresses found
+        :param anonymizer: TextAnonymizer with identifiers already loaded
+        :param detect_emails: Default for email detection when a request does not say
         """
-        # Comprehensive email regex pattern
-        email_pattern = r'''
-            \b                                          # Word boundary
-            [a-zA-Z0-9.!#$%&'*+/=?^_`{|}~-]+           # Local part - allowed characters
-            @                                           # @ symbol
-            [a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?   # Domain name part
-            (?:\.[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?)* # Subdomains
-            \.[a-zA-Z]{2,}                             # Top-level domain (2+ chars)
-            \b                                          # Word boundary
-        '''
-        
-        # Find all email matches using verbose regex
-        emails = re.findall(email_pattern, text, re.VERBOSE)
-        
-        # Also try a simpler pattern as backup to catch any missed emails
-        simple_email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b'
-        simple_emails = re.findall(simple_email_pattern, text)
-        
-        # Combine both results and remove duplicates
-        all_emails = list(set(emails + simple_emails))
-        
-        return all_emails
+        self.anonymizer = anonymizer
+        self.detect_emails = detect_emails
+        self.detected_emails = {}
+        self.saved_size = len(anonymizer.word_to_code)
+        self.started = time.time()
+        self.requests = {}
+        self.errors = 0
+        self.documents = 0
+        self.bytes_processed = 0
+        self.latencies = {}
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._writers = set()
     
-    def _detect_emails_and_add_to_identifiers(self, text):
+    def anonymize_texts(self, texts, detect_emails):
         """
-        Detect email addresses in text and add them to the identifiers set.
+        Anonymize a batch of documents in the shared code space.
         
-        :param text: Input text
-        :return: List of detected emails
+        :param texts: List of documents
+        :param detect_emails: Whether to automatically detect and anonymize emails
+        :return: List of anonymized documents
         """
-        emails = self._find_email_addresses(text)
-        
-        if emails:
-            print(f"Auto-detected {len(emails)} email addresses:")
-            for email in sorted(emails):
-                print(f"  - {email}")
-                self.identifiers.add(email.lower())
-            print("Added emails to identifiers for anonymization.")
-        
-        return emails
+        results = []
+        for text in texts:
+            found_items = {}
+            detected_emails = {}
+            results.append(''.join(self.anonymizer._anonymize_chunks(
+                [text], detect_emails, found_items, detected_emails)))
+            # Same as anonymize(): detected emails become identifiers afterwards
+            for email in detected_emails:
+                self.anonymizer._add_identifier(email)
+                self.detected_emails[email] = None
+        return results
     
-    def _generate_replacement_filename(self, input_filename):
+    def deanonymize_texts(self, texts, replacement_file=None):
         """
-        Generate a unique replacement filename with timestamp.
+        Restore a batch of documents.
         
-        :param input_filename: Name of the input file being processed
-        :return: Unique replacement filename
+        :param texts: List of anonymized documents
+        :param replacement_file: Replacement file to use (default: the in-memory mapping)
+        :return: List of restored documents
         """
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        base_name = os.path.splitext(os.path.basename(input_filename))[0]
-        filename = f"replacements_{base_name}_{timestamp}.json"
-        full_path = os.path.join(self.replacements_dir, filename)
-        
-        # Check if file already exists (unlikely but possible)
-        counter = 1
-        while os.path.exists(full_path):
-            filename = f"replacements_{base_name}_{timestamp}_{counter:02d}.json"
-            full_path = os.path.join(self.replacements_dir, filename)
-            counter += 1
-        
-        return full_path
+        if replacement_file:
+            loaded = self.anonymizer._load_code_matcher(replacement_file)
+            if loaded is None:
+                raise ValueError(f"cannot load replacement file '{replacement_file}'")
+            code_to_word, _, pattern = loaded
+        else:
+            code_to_word, pattern = self.anonymizer._current_code_matcher()
+        return [''.join(self.anonymizer._restore_chunks([text], code_to_word, pattern))
+                for text in texts]
     
-    def _generate_output_filename(self, input_filename, suffix=""):
+    def _resolve_replacement_file(self, replacement_file):
         """
-        Generate output filename based on input filename with timestamp.
+        Resolve a requested replacement file, which has to be inside the
+        replacements directory (symlinks and '..' are followed first).
         
-        :param input_filename: Original input filename
-        :param suffix: Optional suffix to add before timestamp
-        :return: Generated output filename
+        :param replacement_file: Path as returned by /save, or a file name in the directory
+        :return: Resolved path, or None if it is outside the directory
         """
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        base_name = os.path.splitext(input_filename)[0]
-        extension = os.path.splitext(input_filename)[1]
-        
-        if suffix:
-            return f"{base_name}_{suffix}_{timestamp}{extension}"
-        else:
-            return f"{base_name}_{timestamp}{extension}"
+        root = os.path.realpath(self.anonymizer.replacements_dir)
+        for candidate in (replacement_file, os.path.join(root, replacement_file)):
+            path = os.path.realpath(candidate)
+            if path != root and os.path.commonpath([root, path]) == root:
+                return path
+        return None
     
-    def _generate_code(self):
+    def save(self):
         """
-        Generate a unique code for anonymization.
+        Write the in-memory mapping to a replacement file.
         
-        :return: Unique code (X01, X02, etc.)
+        :return: Path of the replacement file, or None if there is nothing to save
         """
-        code = f'X{self.current_code_index:02d}'
-        self.current_code_index += 1
-        return code
+        if not self.anonymizer.code_to_word:
+            return None
+        replacement_file = self.anonymizer._save_replacements(
+            "server", self.detect_emails, list(self.detected_emails))
+        self.saved_size = len(self.anonymizer.word_to_code)
+        return replacement_file
     
-    def _should_anonymize_word(self, word):
+    def stats(self):
         """
-        Check if a single word should be anonymized based on the identifiers list.
+        Collect the server statistics.
         
-        :param word: Word to check
-        :return: True if word should be anonymized
+        :return: Dictionary with counters and per-endpoint latency percentiles (ms)
         """
-        return word.lower() in self.identifiers
+        latency = {}
+        for endpoint, samples in self.latencies.items():
+            ordered = sorted(samples)
+            latency[endpoint] = {
+                'count': len(ordered),
+                'p50': _percentile(ordered, 50),
+                'p90': _percentile(ordered, 90),
+                'p99': _percentile(ordered, 99),
+                'max': round(ordered[-1], 3),
+            }
+        stats = {
+            'uptime_seconds': round(time.time() - self.started, 3),
+            'requests': self.requests,
+            'errors': self.errors,
+            'documents': self.documents,
+            'bytes_processed': self.bytes_processed,
+            'identifiers': len(self.anonymizer.identifiers),
+            'mappings': len(self.anonymizer.code_to_word),
+            'unsaved_mappings': len(self.anonymizer.word_to_code) - self.saved_size,
+            'mapping_cache': dict(self.anonymizer.mapping_cache_stats, size=len(self.anonymizer._code_matchers)),
+            'latency_ms': latency,
+        }
+        if self.anonymizer.metrics is not None:
+            stats['profile'] = self.anonymizer.metrics.report()
+        return stats
     
-    def _find_multi_word_matches(self, text):
+    async def _dispatch(self, method, path, body):
         """
-        Find multi-word identifiers in the text.
+        Route one request.
         
-        :param text: Input text
-        :return: List of tuples (start_pos, end_pos, original_phrase, identifier)
+        :return: Tuple of (HTTP status, response object)
         """
-        matches = []
-        text_lower = text.lower()
+        loop = asyncio.get_running_loop()
         
-        # Sort identifiers by length (longest first) to prioritize longer matches
-        sorted_identifiers = sorted([id for id in self.identifiers if ' ' in id], 
-                                  key=len, reverse=True)
+        if path == '/stats':
+            if method != 'GET':
+                return 405, {'error': 'use GET'}
+            return 200, self.stats()
         
-        for identifier in sorted_identifiers:
-            identifier_lower = identifier.lower()
-            start = 0
-            
+        if path not in ('/anonymize', '/deanonymize', '/save'):
+            return 404, {'error': f'unknown endpoint {path}'}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+        
+        if path == '/save':
+            replacement_file = await loop.run_in_executor(self._executor, self.save)
+            return 200, {'replacement_file': replacement_file}
+        
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError as e:
+            return 400, {'error': f'invalid JSON: {e}'}
+        if not isinstance(request, dict):
+            return 400, {'error': 'request body must be a JSON object'}
+        
+        # A single document or a batch of documents per request
+        single = 'text' in request
+        texts = [request['text']] if single else request.get('texts')
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            return 400, {'error': 'expected "text" (string) or "texts" (list of strings)'}
+        
+        if path == '/anonymize':
+            detect_emails = request.get('detect_emails', self.detect_emails)
+            if not isinstance(detect_emails, bool):
+                return 400, {'error': '"detect_emails" must be true or false'}
+            work = lambda: self.anonymize_texts(texts, detect_emails)
+        else:
+            replacement_file = request.get('replacement_file')
+            if replacement_file is not None:
+                if not isinstance(replacement_file, str):
+                    return 400, {'error': '"replacement_file" must be a string'}
+                replacement_file = replacement_file and self._resolve_replacement_file(replacement_file)
+                if replacement_file is None:
+                    return 400, {'error': '"replacement_file" must be inside the replacements directory'}
+            work = lambda: self.deanonymize_texts(texts, replacement_file)
+        
+        try:
+            results = await loop.run_in_executor(self._executor, work)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        
+        self.documents += len(texts)
+        self.bytes_processed += sum(len(text.encode('utf-8')) for text in texts)
+        return 200, {'text': results[0]} if single else {'texts': results}
+    
+    async def _handle_connection(self, reader, writer):
+        """
+        Serve the HTTP/1.1 requests of one client connection (keep-alive supported).
+        """
+        self._writers.add(writer)
+        try:
             while True:
-                # Find the identifier in the text (case-insensitive)
-                pos = text_lower.find(identifier_lower, start)
-                if pos == -1:
+                request_line = await reader.readline()
+                if not request_line.strip():
                     break
                 
-                # Check if it's a whole phrase (word boundaries)
-                end_pos = pos + len(identifier)
-                
-                # Check start boundary
-                if pos > 0 and text[pos-1].isalnum():
-                    start = pos + 1
-                    continue
-                
-                # Check end boundary
-                if end_pos < len(text) and text[end_pos].isalnum():
-                    start = pos + 1
-                    continue
-                
-                # Extract the original phrase with its case
-                original_phrase = text[pos:end_pos]
-                
-                # Check if this position is already covered by a longer match
-                overlap = False
-                for existing_start, existing_end, _, _ in matches:
-                    if (pos >= existing_start and pos < existing_end) or \
-                       (end_pos > existing_start and end_pos <= existing_end):
-                        overlap = True
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
                         break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
                 
-                if not overlap:
-                    matches.append((pos, end_pos, original_phrase, identifier))
+                start = time.perf_counter()
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                    body = await reader.readexactly(int(headers.get('content-length', 0)))
+                except ValueError:
+                    method, target, version = 'INVALID', '/', 'HTTP/1.0'
+                    status, response = 400, {'error': 'malformed request'}
+                else:
+                    try:
+                        status, response = await self._dispatch(method, target.split('?', 1)[0], body)
+                    except Exception as e:
+                        # Answer instead of dropping the connection, and keep serving
+                        print(f"Error handling {method} {target}: {e!r}")
+                        status, response = 500, {'error': f'internal error: {e}'}
                 
-                start = pos + 1
-        
-        # Sort matches by position to process them in order
-        return sorted(matches, key=lambda x: x[0])
+                endpoint = target.split('?', 1)[0] if status != 404 else 'other'
+                elapsed = (time.perf_counter() - start) * 1000
+                self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+                self.latencies.setdefault(endpoint, deque(maxlen=SERVER_LATENCY_WINDOW)).append(elapsed)
+                if status >= 400:
+                    self.errors += 1
+                
+                data = json.dumps(response, ensure_ascii=False).encode('utf-8')
+                keep_alive = (version == 'HTTP/1.1' and status != 400 and
+                              headers.get('connection', '').lower() != 'close')
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
     
-    def anonymize(self, text, input_filename="unknown", detect_emails=True):
+    async def serve(self, host='127.0.0.1', port=SERVER_PORT, socket_path=None):
         """
-        Anonymize the given text by replacing identified words and phrases while preserving case.
-        Optionally auto-detect email addresses.
+        Run the server until interrupted, then save the mapping if it changed.
         
-        :param text: Input text to anonymize
-        :param input_filename: Name of the input file (for replacement filename generation)
-        :param detect_emails: Whether to automatically detect and anonymize emails
-        :return: Tuple of (anonymized_text, replacement_file_path)
+        :param host: Host to listen on
+        :param port: TCP port (0 picks a free port)
+        :param socket_path: Listen on this Unix socket instead of TCP
         """
-        # Auto-detect emails if requested
-        detected_emails = []
-        if detect_emails:
-            detected_emails = self._detect_emails_and_add_to_identifiers(text)
-        
-        if not self.identifiers:
-            print("No identifiers loaded. Text will not be anonymized.")
-            return text, None
-        
-        anonymized_text = text
-        items_to_anonymize = set()
-        
-        # First, find multi-word identifiers
-        multi_word_matches = self._find_multi_word_matches(text)
-        processed_positions = set()
-        
-        # Process multi-word matches first (they have priority)
-        for start_pos, end_pos, original_phrase, identifier in multi_word_matches:
-            # Mark these positions as processed
-            for i in range(start_pos, end_pos):
-                processed_positions.add(i)
-            
-            items_to_anonymize.add(original_phrase)
-        
-        # Then find single words that haven't been processed yet
-        words_pattern = r'\b\w+\b'
-        for match in re.finditer(words_pattern, text):
-            word_start, word_end = match.span()
-            word = match.group()
-            
-            # Skip if this word is part of a multi-word identifier already processed
-            if any(pos in processed_positions for pos in range(word_start, word_end)):
-                continue
-            
-            if self._should_anonymize_word(word):
-                items_to_anonymize.add(word)
-        
-        # Also check for email addresses directly (in case word boundaries missed some)
-        if detect_emails:
-            for email in detected_emails:
-                # Find all occurrences of this email in the text
-                for match in re.finditer(re.escape(email), text, re.IGNORECASE):
-                    items_to_anonymize.add(match.group())
+        if socket_path:
+            server = await asyncio.start_unix_server(self._handle_connection, path=socket_path)
+            print(f"Serving on unix socket {socket_path}")
+        else:
+            server = await asyncio.start_server(self._handle_connection, host, port)
+            bound = server.sockets[0].getsockname()
+            print(f"Serving on http://{bound[0]}:{bound[1]}")
+        sys.stdout.flush()
         
-        if not items_to_anonymize:
-            print("No identifiers found in text. No anonymization needed.")
-            return text, None
+        loop = asyncio.get_running_loop()
+        stop = loop.create_future()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, lambda: stop.done() or stop.set_result(None))
+            except (NotImplementedError, RuntimeError):
+                pass  # Ctrl+C still raises KeyboardInterrupt
         
-        print(f"Found {len(items_to_anonymize)} identifiers to anonymize:")
-        for item in sorted(items_to_anonymize, key=len, reverse=True):
-            print(f"  - '{item}'")
+        await stop
         
-        # Anonymize each item (longest first to avoid partial replacements)
-        for item in sorted(items_to_anonymize, key=len, reverse=True):
-            # Check if this item (case-insensitive) already has a code
-            existing_code = None
-            for existing_item, code in self.word_to_code.items():
-                if existing_item.lower() == item.lower():
-                    existing_code = code
-                    break
-            
-            if existing_code is None:
-                # Create new code for this item
-                code = self._generate_code()
-                self.word_to_code[item] = code
-                self.code_to_word[code] = item
+        print("Shutting down server.")
+        server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await server.wait_closed()
+        if len(self.anonymizer.word_to_code) != self.saved_size:
+            await loop.run_in_executor(self._executor, self.save)
+        self._executor.shutdown()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def _percentile(ordered, percent):
+    """
+    Nearest-rank percentile of a sorted list.
+    
+    :param ordered: Sorted list of values
+    :param percent: Percentile (0-100)
+    :return: The percentile value, rounded to microseconds
+    """
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return round(ordered[int(rank) - 1], 3)
+
+
+def serve_main(argv):
+    """
+    Entry point of the serve subcommand.
+    
+    :param argv: Command line arguments after 'serve'
+    """
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} serve",
+        description='Serve anonymize/deanonymize over a local HTTP API with one warm anonymizer',
+        epilog="""
+Endpoints:
+  POST /anonymize    {"text": "..."} or {"texts": ["...", ...]}, optional "detect_emails"
+  POST /deanonymize  {"text": "..."} or {"texts": [...]}, optional "replacement_file"
+                     (inside the replacements directory)
+  POST /save         Write the current mapping to a replacement file
+  GET  /stats        Request counters and latency percentiles
+
+Example:
+  curl -s localhost:8765/anonymize -d '{"text": "Jan Jansen woont in Amsterdam"}'
+        """,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Host to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=SERVER_PORT,
+                        help=f'TCP port to listen on, 0 picks a free port (default: {SERVER_PORT})')
+    parser.add_argument('--socket', metavar='PATH',
+                        help='Listen on a Unix socket instead of TCP')
+    parser.add_argument('-i', '--identifiers-file', default='identifiers.txt',
+                        help='File containing identifiers to anonymize, one per line (default: identifiers.txt)')
+    parser.add_argument('-d', '--replacements-dir', default='replacements',
+                        help='Directory for storing replacement mapping files (default: replacements/)')
+    parser.add_argument('-f', '--replacement-file',
+                        help='Continue the code space of an existing replacement file')
+    parser.add_argument('--mapping-store', metavar='PATH',
+                        help='Keep the mapping in a persistent store (.db/.sqlite: SQLite, otherwise an append-only log)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Collect stage timings and counters and include them in /stats')
+    parser.add_argument('--no-email', action='store_true',
+                        help='Disable automatic email detection by default')
+    parser.add_argument('--no-index', action='store_true',
+                        help='Do not use or write the compiled identifier index (IDENTIFIERS_FILE.idx)')
+    args = parser.parse_args(argv)
+    
+    if args.replacement_file and args.mapping_store:
+        print("Error: --replacement-file (-f) cannot be combined with --mapping-store.")
+        sys.exit(1)
+    
+    anonymizer = TextAnonymizer(args.identifiers_file, args.replacements_dir, not args.no_index,
+                                args.mapping_store, args.profile)
+    if args.replacement_file:
+        if not os.path.exists(args.replacement_file):
+            print(f"Error: Replacement file '{args.replacement_file}' not found.")
+            sys.exit(1)
+        anonymizer.load_replacements(args.replacement_file)
+    
+    server = PseudonymizationServer(anonymizer, not args.no_email)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+    except OSError as e:
+        print(f"Error starting server: {e}")
+        sys.exit(1)
+
+
+def _split_fields(value):
+    """
+    Split a comma-separated --fields value.
+    
+    :param value: Option value or None
+    :return: List of field names, or None
+    """
+    if value is None:
+        return None
+    return [field.strip() for field in value.split(',') if field.strip()]
+
+
+def _run_structured(args, profile):
+    """
+    Anonymize or deanonymize a CSV or JSONL file record by record (--format).
+    
+    :param args: Parsed command line arguments
+    :param profile: Whether to collect metrics
+    """
+    input_filename = args.input_file or "user_input"
+    if args.input_file and not os.path.exists(args.input_file):
+        print(f"Error: Input file '{args.input_file}' not found.")
+        sys.exit(1)
+    if args.reverse and not args.replacement_file and not args.mapping_store:
+        print("Error: --replacement-file (-f) or --mapping-store is required for deanonymization.")
+        sys.exit(1)
+    
+    anonymizer = TextAnonymizer(args.identifiers_file, args.replacements_dir, not args.no_index,
+                                args.mapping_store, profile)
+    operation = "deanonymized" if args.reverse else "anonymized"
+    if not args.output_file:
+        args.output_file = anonymizer._generate_output_filename(input_filename, operation)
+        print(f"Auto-generated output filename: {args.output_file}")
+    
+    fields = _split_fields(args.fields)
+    exact_fields = _split_fields(args.exact_fields) or []
+    if fields is None and exact_fields:
+        # Only the exact fields were asked for
+        fields = []
+    
+    try:
+        source = open(args.input_file, 'r', encoding='utf-8', newline='') if args.input_file else sys.stdin
+        with source, open(args.output_file, 'w', encoding='utf-8', newline='') as out:
+            if args.format == 'csv':
+                # The header names the fields; the delimiter is detected from the
+                # first lines, so a header without one still gets the right dialect
+                sample = list(islice(source, CSV_SNIFF_LINES))
+                try:
+                    delimiter = csv.Sniffer().sniff(''.join(sample), delimiters=',;\t|').delimiter
+                except csv.Error:
+                    delimiter = ','
+                reader = csv.reader(chain(sample, source), delimiter=delimiter)
+                header = next(reader, [])
+                missing = [field for field in (fields or []) + exact_fields if field not in header]
+                if missing:
+                    print(f"Error: Unknown field(s) {', '.join(missing)}; columns are: {', '.join(header)}")
+                    sys.exit(1)
+                keys = None if fields is None else [header.index(field) for field in fields]
+                exact_keys = [header.index(field) for field in exact_fields]
+                writer = csv.writer(out, delimiter=delimiter, lineterminator='\n')
+                writer.writerow(header)
+                records = reader
+                write = writer.writerow
             else:
-                # Use existing code
-                code = existing_code
-                # Store this specific case variant
-                self.word_to_code[item] = code
+                keys = fields
+                exact_keys = exact_fields
+                records = (json.loads(line) for line in source if line.strip())
+                write = lambda record: out.write(json.dumps(record, ensure_ascii=False) + '\n')
             
-            # Replace all occurrences of this item with its code
-            # For multi-word phrases and emails, we need word boundaries at start and end
-            if ' ' in item or '@' in item:
-                # Multi-word phrase or email - use word boundary at start and end only
-                pattern = r'\b' + re.escape(item) + r'\b'
+            if args.reverse:
+                processed = anonymizer.deanonymize_records(records, args.replacement_file,
+                                                           None if keys is None else keys + exact_keys)
             else:
-                # Single word
-                pattern = r'\b' + re.escape(item) + r'\b'
-            
-            anonymized_text = re.sub(pattern, code, anonymized_text, flags=re.IGNORECASE)
-        
-        # Generate unique replacement file
-        replacement_file = self._generate_replacement_filename(input_filename)
-        
-        # Save replacements
-        replacement_data = {
-            'metadata': {
-                'created': datetime.now().isoformat(),
-                'input_file': input_filename,
-                'identifiers_file': self.identifiers_file,
-                'total_replacements': len(self.word_to_code),
-                'emails_detected': len(detected_emails) if detect_emails else 0,
-                'detected_emails': detected_emails if detect_emails else []
-            },
-            'word_to_code': self.word_to_code,
-            'code_to_word': self.code_to_word
-        }
-        
-        with open(replacement_file, 'w', encoding='utf-8') as f:
-            json.dump(replacement_data, f, indent=2, ensure_ascii=False)
-        
-        print(f"Replacement mapping saved to: {replacement_file}")
-        
-        return anonymized_text, replacement_file
+                processed = anonymizer.anonymize_records(records, input_filename, keys, exact_keys,
+                                                         not args.no_email)
+            for record in processed:
+                write(record)
+    except (ValueError, csv.Error) as e:
+        print(f"Error processing {args.format.upper()} input: {e}")
+        sys.exit(1)
     
-    def deanonymize(self, text, replacement_file):
-        """
-        Restore the original words from anonymized text using a specific replacement file.
-        
-        :param text: Anonymized text
-        :param replacement_file: Path to the replacement JSON file
-        :return: Original text
-        """
-        if not os.path.exists(replacement_file):
-            print(f"Error: Replacement file '{replacement_file}' not found.")
-            return text
-        
-        try:
-            with open(replacement_file, 'r', encoding='utf-8') as f:
-                replacement_data = json.load(f)
-            
-            code_to_word = replacement_data.get('code_to_word', {})
-            
-            if not code_to_word:
-                print("No replacement mappings found in file.")
-                return text
-            
-            # Show some metadata if available
-            metadata = replacement_data.get('metadata', {})
-            if 'emails_detected' in metadata:
-                print(f"This replacement file contained {metadata['emails_detected']} auto-detected emails.")
-            
-            # Restore each code to its original word
-            deanonymized_text = text
-            for code, word in code_to_word.items():
-                # Use word boundary regex to avoid partial matches
-                pattern = r'\b' + re.escape(code) + r'\b'
-                deanonymized_text = re.sub(pattern, word, deanonymized_text)
-            
-            print(f"Deanonymization completed using {len(code_to_word)} mappings.")
-            
-            return deanonymized_text
-            
-        except Exception as e:
-            print(f"Error reading replacement file: {e}")
-            return text
+    print(f"{operation.capitalize()} records saved to {args.output_file}")
+    _report_profile(anonymizer.metrics, args.profile_json)
+
+
+def _report_profile(metrics, json_file=None):
+    """
+    Print the collected metrics and optionally write them as JSON.
+    
+    :param metrics: Metrics object, or None when profiling is off
+    :param json_file: Path of the JSON file, '-' for stdout, or None
+    """
+    if metrics is None:
+        return
+    if json_file == '-':
+        # main() sent everything else to stderr, so stdout holds only the JSON
+        print(json.dumps(metrics.report(), indent=2), file=sys.__stdout__)
+        return
+    metrics.print_report()
+    if json_file:
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump(metrics.report(), f, indent=2)
+        print(f"Profile written to {json_file}")
+
 
 def main():
+    # The serve subcommand has its own options
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        serve_main(sys.argv[2:])
+        return
+    
     # Set up argument parser
     parser = argparse.ArgumentParser(
         description='Text Pseudonymization Utility - Anonymize and deanonymize text by replacing identifiers with codes',
@@ -377,9 +4095,19 @@ Examples:
   %(prog)s document.txt                           # Anonymize document.txt (auto-detect emails)
   %(prog)s document.txt output.txt                # Anonymize with specific output file
   %(prog)s --no-email document.txt                # Anonymize without email detection
+  %(prog)s --stream large_export.log              # Anonymize a large file with bounded memory
+  %(prog)s --batch docs/ --workers 8              # Anonymize every file in docs/ with one shared mapping
+  %(prog)s --workers 8 huge_dump.sql              # Split one large file across 8 worker processes
+  %(prog)s --mmap huge_dump.sql                    # Anonymize a large file through a memory map
+  %(prog)s --batch docs/ --incremental            # Only re-process what changed since the last run
+  %(prog)s --format csv --fields notes --exact-fields name,email export.csv  # Anonymize CSV columns
   %(prog)s                                        # Interactive mode - paste text to anonymize
   %(prog)s -r -f replacements/file.json input.txt # Deanonymize using replacement file
+  %(prog)s -r --pairs restore.tsv --workers 8     # Deanonymize many files, each with its own replacement file
   %(prog)s -i custom_ids.txt -d my_replacements/  # Use custom identifiers and directory
+  %(prog)s --mapping-store codes.db document.txt  # Continue one persistent code space across runs
+  %(prog)s --mapping-store codes.db --export-json codes.json  # Export the store as a replacement file
+  %(prog)s serve --port 8765                      # Serve anonymize/deanonymize on localhost (see serve --help)
 
 The program replaces identifiers (names, places, emails, etc.) with anonymous codes (X01, X02, ...)
 while maintaining text structure. Email addresses are automatically detected and anonymized.
@@ -404,14 +4132,165 @@ Replacement mappings are saved for later deanonymization.
                         help='Directory for storing replacement mapping files (default: replacements/)')
     parser.add_argument('--no-email', action='store_true',
                         help='Disable automatic email detection and anonymization')
+    parser.add_argument('--no-index', action='store_true',
+                        help='Do not use or write the compiled identifier index (IDENTIFIERS_FILE.idx)')
+    parser.add_argument('--mapping-store', metavar='PATH',
+                        help='Keep the mapping in a persistent store that new codes are appended to, instead of '
+                             'a replacement file per run (.db/.sqlite: SQLite, otherwise an append-only log)')
+    parser.add_argument('--export-json', metavar='FILE',
+                        help='Export the --mapping-store to a replacement file in the JSON layout and exit')
+    parser.add_argument('--profile', action='store_true',
+                        help='Print time per stage, bytes processed, matches per kind and mapping size')
+    parser.add_argument('--profile-json', metavar='FILE',
+                        help='Write the profile as JSON to FILE (use - for stdout, with all other output on stderr); '
+                             'implies --profile')
+    parser.add_argument('--format', choices=['text', 'csv', 'jsonl'], default='text',
+                        help='Input format: plain text, or CSV/JSONL processed record by record (default: text)')
+    parser.add_argument('--fields', metavar='FIELDS',
+                        help='Comma-separated CSV columns or JSONL keys to anonymize (default: all, '
+                             'unless --exact-fields is given)')
+    parser.add_argument('--exact-fields', metavar='FIELDS',
+                        help='Comma-separated columns/keys whose whole value is looked up as one identifier '
+                             '(e.g. name or email columns)')
+    parser.add_argument('--mmap', action='store_true',
+                        help='Anonymize the input file through a memory map: ASCII text is matched as bytes and '
+                             'unchanged byte ranges are copied to the output in bulk (line endings are kept as they are)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Process the input in chunks with bounded memory (reads stdin if no input file is given)')
+    parser.add_argument('--batch', metavar='DIR_OR_GLOB',
+                        help='Anonymize all files in a directory or matching a glob pattern, with one shared replacement '
+                             'file (with -r -f: deanonymize them with that replacement file)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes for --batch and --pairs (default: number of CPUs); with a single '
+                             'input file, splits that file into segments that are matched in parallel')
+    parser.add_argument('--output-dir',
+                        help='Directory for the output files of --batch and --pairs (default: next to each input file)')
+    parser.add_argument('--pairs', metavar='FILE',
+                        help='With -r: deanonymize every file listed in FILE with its own replacement file, in '
+                             'a worker pool (FILE has "input_file<TAB>replacement_file" per line, or is a '
+                             'manifest.json written by --incremental)')
+    parser.add_argument('--cache-size', type=int, default=MAPPING_CACHE_SIZE,
+                        help=f'Number of parsed replacement files kept in memory per process when deanonymizing '
+                             f'(default: {MAPPING_CACHE_SIZE})')
+    parser.add_argument('--incremental', action='store_true',
+                        help='With --batch: only process files that changed or are affected by changed '
+                             'identifiers since the previous run (manifest in the replacements directory)')
     
     # Parse arguments
     args = parser.parse_args()
+    profile = args.profile or args.profile_json is not None
+    if args.profile_json == '-':
+        # Keep stdout parseable for the JSON profile; progress goes to stderr
+        sys.stdout = sys.stderr
+    
+    if args.export_json:
+        if not args.mapping_store:
+            print("Error: --export-json requires --mapping-store.")
+            sys.exit(1)
+        if not os.path.exists(args.mapping_store):
+            print(f"Error: Mapping store '{args.mapping_store}' not found.")
+            sys.exit(1)
+        anonymizer = TextAnonymizer(args.identifiers_file, args.replacements_dir, not args.no_index,
+                                    args.mapping_store)
+        anonymizer.export_mapping(args.export_json)
+        return
+    
+    if args.incremental and not args.batch:
+        print("Error: --incremental requires --batch.")
+        sys.exit(1)
+    
+    if args.pairs and not args.reverse:
+        print("Error: --pairs requires --reverse (-r).")
+        sys.exit(1)
+    
+    if args.reverse and (args.batch or args.pairs):
+        # Bulk deanonymization
+        if args.incremental or (args.batch and args.pairs):
+            print("Error: use either --batch or --pairs with --reverse, without --incremental.")
+            sys.exit(1)
+        if args.pairs:
+            try:
+                pairs = _read_restore_pairs(args.pairs)
+            except (OSError, ValueError) as e:
+                print(f"Error reading pairs file '{args.pairs}': {e}")
+                sys.exit(1)
+        else:
+            if not args.replacement_file:
+                print("Error: --batch with --reverse requires --replacement-file (-f).")
+                sys.exit(1)
+            pairs = [(path, args.replacement_file) for path in _expand_batch_inputs(args.batch)]
+        if not pairs:
+            print(f"Error: No input files found for '{args.pairs or args.batch}'.")
+            sys.exit(1)
+        
+        anonymizer = TextAnonymizer(args.identifiers_file, args.replacements_dir, not args.no_index,
+                                    args.mapping_store, profile)
+        anonymizer.mapping_cache_size = args.cache_size
+        anonymizer.deanonymize_batch(pairs, args.workers, args.output_dir)
+        _report_profile(anonymizer.metrics, args.profile_json)
+        return
+    
+    if args.batch:
+        input_files = _expand_batch_inputs(args.batch)
+        if not input_files:
+            print(f"Error: No input files found for '{args.batch}'.")
+            sys.exit(1)
+        
+        anonymizer = TextAnonymizer(args.identifiers_file, args.replacements_dir, not args.no_index,
+                                    args.mapping_store, profile)
+        if args.incremental:
+            anonymizer.anonymize_incremental(input_files, args.workers, not args.no_email, args.output_dir)
+        else:
+            anonymizer.anonymize_batch(input_files, args.workers, not args.no_email, args.output_dir)
+        _report_profile(anonymizer.metrics, args.profile_json)
+        return
+    
+    if args.format != 'text':
+        _run_structured(args, profile)
+        return
+    
+    if args.mmap or args.workers is not None:
+        # One large file, through a memory map or split across worker processes
+        option = '--mmap' if args.mmap else '--workers'
+        if args.reverse or args.stream or not args.input_file or (args.mmap and args.workers is not None):
+            print(f"Error: {option} requires an input file to anonymize "
+                  f"(without --reverse, --stream{' or --workers' if args.mmap else ''}).")
+            sys.exit(1)
+        if not os.path.exists(args.input_file):
+            print(f"Error: Input file '{args.input_file}' not found.")
+            sys.exit(1)
+        
+        anonymizer = TextAnonymizer(args.identifiers_file, args.replacements_dir, not args.no_index,
+                                    args.mapping_store, profile)
+        if not args.output_file:
+            args.output_file = anonymizer._generate_output_filename(args.input_file, "anonymized")
+            print(f"Auto-generated output filename: {args.output_file}")
+        try:
+            if args.mmap:
+                anonymizer.anonymize_mapped(args.input_file, args.output_file, not args.no_email)
+            else:
+                anonymizer.anonymize_parallel(args.input_file, args.output_file, args.workers, not args.no_email)
+        except Exception as e:
+            print(f"Error processing input file: {e}")
+            sys.exit(1)
+        
+        print(f"Anonymized text saved to {args.output_file}")
+        _report_profile(anonymizer.metrics, args.profile_json)
+        return
     
     # Handle input - either from file or user input
     input_filename = "user_input"  # Default filename for user input
     
-    if args.input_file:
+    # In streaming mode the input is read chunk by chunk while processing
+    stream_input = args.stream
+    
+    if stream_input:
+        if args.input_file:
+            if not os.path.exists(args.input_file):
+                print(f"Error: Input file '{args.input_file}' not found.")
+                sys.exit(1)
+            input_filename = args.input_file
+    elif args.input_file:
         # Check if input file exists
         if not os.path.exists(args.input_file):
             print(f"Error: Input file '{args.input_file}' not found.")
@@ -454,7 +4333,8 @@ Replacement mappings are saved for later deanonymization.
             sys.exit(1)
     
     # Create anonymizer
-    anonymizer = TextAnonymizer(args.identifiers_file, args.replacements_dir)
+    anonymizer = TextAnonymizer(args.identifiers_file, args.replacements_dir, not args.no_index,
+                                args.mapping_store, profile)
     
     # Generate output filename if not provided
     if not args.output_file:
@@ -464,13 +4344,35 @@ Replacement mappings are saved for later deanonymization.
             args.output_file = anonymizer._generate_output_filename(input_filename, "anonymized")
         print(f"Auto-generated output filename: {args.output_file}")
     
+    if args.reverse and not args.replacement_file and not args.mapping_store:
+        print("Error: --replacement-file (-f) or --mapping-store is required for deanonymization.")
+        sys.exit(1)
+    
     # Process text based on mode
-    if args.reverse:
-        # Deanonymize
-        if not args.replacement_file:
-            print("Error: --replacement-file (-f) is required for deanonymization.")
+    if stream_input:
+        # Process chunk by chunk, writing output as it is produced
+        detect_emails = not args.no_email
+        try:
+            source = open(args.input_file, 'r', encoding='utf-8') if args.input_file else sys.stdin
+            with source, open(args.output_file, 'w', encoding='utf-8') as f:
+                chunks = iter(lambda: source.read(STREAM_CHUNK_SIZE), '')
+                if args.reverse:
+                    pieces = anonymizer.deanonymize_stream(chunks, args.replacement_file)
+                    operation = "Deanonymized"
+                else:
+                    pieces = anonymizer.anonymize_stream(chunks, input_filename, detect_emails)
+                    operation = "Anonymized"
+                for piece in pieces:
+                    f.write(piece)
+        except Exception as e:
+            print(f"Error processing input stream: {e}")
             sys.exit(1)
         
+        print(f"{operation} text saved to {args.output_file}")
+        _report_profile(anonymizer.metrics, args.profile_json)
+        return
+    elif args.reverse:
+        # Deanonymize
         processed_text = anonymizer.deanonymize(text, args.replacement_file)
         operation = "Deanonymized"
     else:
@@ -481,14 +4383,19 @@ Replacement mappings are saved for later deanonymization.
     
     # Write output file
     try:
+        start = time.perf_counter()
         with open(args.output_file, 'w', encoding='utf-8') as f:
             f.write(processed_text)
+        if anonymizer.metrics is not None:
+            anonymizer.metrics.add_time('write_output', time.perf_counter() - start)
         
         print(f"{operation} text saved to {args.output_file}")
         
     except Exception as e:
         print(f"Error writing output file: {e}")
         sys.exit(1)
+    
+    _report_profile(anonymizer.metrics, args.profile_json)
 
 if __name__ == '__main__':
     main()